@@ -0,0 +1,166 @@
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+import requests
+
+from soda_cache import atomic_write, atomic_write_parquet
+
+# DEC publishes one hourly monitoring file per month
+AQ_BASE_URL = 'https://azdohv2staticweb.blob.core.windows.net/$web/hist/csv'
+AQ_START_YEAR = 2022
+
+BASE_DIR = Path(__file__).parent
+AQ_CACHE_DIR = BASE_DIR / 'data' / 'cache' / 'air_quality'
+AQ_STORE_DIR = AQ_CACHE_DIR / 'store'
+SITE_INFO_URL = f'{AQ_BASE_URL}/location.csv'
+
+
+def month_url(year, month):
+    return f'{AQ_BASE_URL}/{year}/{month}/hourlyMonitoring.csv'
+
+
+# every (year, month) from the start of the archive through the current month
+def archive_months(start_year=AQ_START_YEAR, today=None):
+    today = today or datetime.date.today()
+    return [(year, month)
+            for year in range(start_year, today.year + 1)
+            for month in range(1, 13)
+            if (year, month) <= (today.year, today.month)]
+
+
+def _download(url, path):
+    response = requests.get(url, timeout=60)
+    response.raise_for_status()
+    # a killed download never leaves a partial month behind
+    atomic_write(path, lambda tmp_path: tmp_path.write_bytes(response.content))
+
+
+def fetch_month(year, month, today=None, cache_dir=AQ_CACHE_DIR):
+    today = today or datetime.date.today()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    # closed months never change, so a cached copy is always valid.
+    # the current month is still being written to: it is re-downloaded every time and
+    # kept under a separate name so it is never mistaken for a closed month later on.
+    is_current = (year, month) == (today.year, today.month)
+    path = cache_dir / (f'{year}-{month:02d}.current.csv' if is_current else f'{year}-{month:02d}.csv')
+    if is_current or not path.exists():
+        try:
+            _download(month_url(year, month), path)
+        except requests.exceptions.HTTPError:
+            # the current month's file is not published until its first readings arrive
+            if is_current:
+                return None
+            raise
+        if not is_current:
+            (cache_dir / f'{year}-{month:02d}.current.csv').unlink(missing_ok=True)
+
+    return pd.read_csv(path)
+
+
+# Columnar store: one parquet file per month with site metadata joined and time parts derived
+
+# fixed schema so every partition can be read as a single dataset
+STORE_DTYPES = {
+    'ObservationTimeUTC': 'datetime64[ns]',
+    'SiteID': 'string',
+    'SiteName': 'string',
+    'Latitude': 'float64',
+    'Longitude': 'float64',
+    'Value': 'float64',
+    'Hour': 'int8',
+    'Year': 'int16',
+    'Month': 'int8',
+    'Day': 'int8',
+    'iso_year': 'int16',
+    'iso_week': 'int8',
+    'iso_weekday': 'int8',  # Monday=1, Sunday=7
+}
+
+
+def derive_columns(df, siteinfo):
+    df = df.copy()
+    df['ObservationTimeUTC'] = pd.to_datetime(df['ObservationTimeUTC'], errors='coerce')
+    df = df.dropna(subset=['ObservationTimeUTC'])
+    df['SiteID'] = df['SiteID'].astype(str)
+    df = df.merge(siteinfo.assign(SiteID=siteinfo['SiteID'].astype(str)), on='SiteID')
+
+    ts = df['ObservationTimeUTC'].dt
+    df['Hour'] = ts.hour
+    df['Year'] = ts.year
+    df['Month'] = ts.month
+    df['Day'] = ts.day
+
+    iso = ts.isocalendar()
+    df['iso_year'] = iso['year']
+    df['iso_week'] = iso['week']
+    df['iso_weekday'] = iso['day']
+
+    df = df[list(STORE_DTYPES)].astype(STORE_DTYPES)
+    # stored as a parquet date32 column, read back as datetime.date objects
+    df['Date'] = df['ObservationTimeUTC'].dt.date
+    return df
+
+
+def partition_path(year, month, current=False, store_dir=AQ_STORE_DIR):
+    return store_dir / (f'{year}-{month:02d}.current.parquet' if current else f'{year}-{month:02d}.parquet')
+
+
+def store_partitions(store_dir=AQ_STORE_DIR):
+    # (year, month) of every partition on disk, oldest first
+    return sorted({tuple(int(part) for part in path.name.split('.')[0].split('-'))
+                   for path in store_dir.glob('*.parquet')})
+
+
+# Append new months to the store. Closed months are written once; the current month is rewritten.
+def refresh_store(start_year=AQ_START_YEAR, max_workers=8, today=None, store_dir=AQ_STORE_DIR,
+                  cache_dir=AQ_CACHE_DIR):
+    today = today or datetime.date.today()
+    store_dir.mkdir(parents=True, exist_ok=True)
+
+    pending = [(year, month) for year, month in archive_months(start_year, today)
+               if (year, month) == (today.year, today.month)
+               or not partition_path(year, month, store_dir=store_dir).exists()]
+    if not pending:
+        return []
+
+    siteinfo = pd.read_csv(SITE_INFO_URL)
+
+    def build(ym):
+        year, month = ym
+        raw = fetch_month(year, month, today=today, cache_dir=cache_dir)
+        if raw is None:
+            return None
+        current = (year, month) == (today.year, today.month)
+        atomic_write_parquet(derive_columns(raw, siteinfo), partition_path(year, month, current, store_dir))
+        if not current:
+            partition_path(year, month, current=True, store_dir=store_dir).unlink(missing_ok=True)
+        return ym
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        written = list(pool.map(build, pending))
+
+    return [ym for ym in written if ym is not None]
+
+
+# Read only the requested columns and rows; filters use the pyarrow DNF format,
+# e.g. [('iso_week', '==', 14)], and are pushed down to the parquet row groups
+def read_store(columns=None, filters=None, partitions=None, store_dir=AQ_STORE_DIR):
+    if partitions is None:
+        paths = sorted(str(path) for path in store_dir.glob('*.parquet'))
+    else:
+        paths = [str(path) for year, month in partitions
+                 for path in (partition_path(year, month, store_dir=store_dir),
+                              partition_path(year, month, current=True, store_dir=store_dir))
+                 if path.exists()]
+    if not paths:
+        return pd.DataFrame(columns=columns or list(STORE_DTYPES) + ['Date'])
+    return pq.read_table(paths, columns=columns, filters=filters).to_pandas()
+
+
+if __name__ == '__main__':
+    written = refresh_store()
+    print(f'Wrote {len(written)} partition(s) to {AQ_STORE_DIR}')
@@ -0,0 +1,112 @@
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+BASE_DIR = Path(__file__).parent
+DATA_DIR = BASE_DIR / 'data'
+BUDGET_PATH = DATA_DIR / 'arb_budget.xlsx'
+
+
+# 'Category 1', 'Category 2', ... in hierarchy order, however deep the workbook goes
+def category_columns(budget):
+    columns = [col for col in budget.columns if re.fullmatch(r'Category \d+', str(col))]
+    return sorted(columns, key=lambda col: int(col.split()[1]))
+
+
+def insert_line_breaks(text, max_len=30):
+    words = text.split()
+    lines, current = [], ""
+    for word in words:
+        if len(current) + len(word) + 1 > max_len:
+            lines.append(current)
+            current = word
+        else:
+            current += (" " if current else "") + word
+    lines.append(current)
+    return "<br>".join(lines)
+
+
+def format_value(val):
+    if val >= 1e9:
+        return f"${val / 1e9:.2f}B"
+    elif val >= 1e6:
+        return f"${val / 1e6:.0f}M"
+    else:
+        return f"${val:,.0f}"
+
+
+# Node labels and source/target/value links between consecutive category levels.
+# Links into intermediate levels are summed per (parent, child) pair; links into the
+# deepest level are kept per row and carry that row's description as hover text.
+def budget_links(budget):
+    levels = category_columns(budget)
+    labels = pd.Series(pd.unique(budget[levels].values.ravel())).dropna().tolist()
+    label_map = {label: i for i, label in enumerate(labels)}
+
+    links = []
+    for parent, child in zip(levels, levels[1:]):
+        rows = budget.dropna(subset=[child])
+        if child == levels[-1]:
+            if 'Description' in rows.columns:
+                description = rows['Description'].fillna('').apply(insert_line_breaks)
+            else:
+                description = ''
+            flows = rows[[parent, child, 'Budget']].assign(Description=description)
+        else:
+            flows = rows.groupby([parent, child], as_index=False)['Budget'].sum().assign(Description='')
+        links.append(pd.DataFrame({
+            'source': flows[parent].map(label_map).to_numpy(),
+            'target': flows[child].map(label_map).to_numpy(),
+            'value': flows['Budget'].to_numpy(),
+            'Description': flows['Description'].to_numpy(),
+        }))
+
+    return labels, pd.concat(links, ignore_index=True)
+
+
+# node total is what flows in, or what flows out for root nodes
+def node_totals(n_nodes, links):
+    incoming = np.bincount(links['target'], weights=links['value'], minlength=n_nodes)
+    outgoing = np.bincount(links['source'], weights=links['value'], minlength=n_nodes)
+    return np.where(incoming > 0, incoming, outgoing)
+
+
+def build_sankey(labels, links):
+    import plotly.graph_objects as go
+
+    node_budget_values = node_totals(len(labels), links)
+    node_hover_text = [
+        f"<b>{label}</b><br>Total Budget: {format_value(node_budget_values[i])}"
+        for i, label in enumerate(labels)
+    ]
+
+    sankey = go.Figure(data=[go.Sankey(
+        arrangement='snap',
+        node=dict(
+            pad=10,
+            thickness=20,
+            line=dict(color="black", width=0.5),
+            label=labels,
+            customdata=node_hover_text,
+            hovertemplate="%{customdata}<extra></extra>",
+        ),
+        link=dict(
+            source=links['source'],
+            target=links['target'],
+            value=links['value'],
+            customdata=links['Description'],
+            hovertemplate='%{customdata}<extra></extra>'
+        )
+    )])
+
+    sankey.update_layout(font_family = 'Arial', height=600, font_size=14)
+    return sankey
+
+
+# mtime is part of the cache key: the workbook is parsed and the figure built once per version
+@st.cache_data
+def load_budget_sankey(path=BUDGET_PATH, mtime=None):
+    return build_sankey(*budget_links(pd.read_excel(path)))
@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+# Interrupted time series and difference-in-differences estimates for daily series, with
+# moving-block bootstrap confidence intervals. OLS coefficients are linear in the outcome
+# (beta = pinv(X) @ y), so every bootstrap replicate is refit in one batched matrix product.
+
+BOOTSTRAP_REPLICATES = 2000
+BLOCK_LENGTH = 14  # days; resampling two-week blocks keeps the weekly pattern in the residuals
+CI_LEVEL = 0.95
+ESTIMATE_COLUMNS = ['Estimate', 'Std. Error', 'CI Low', 'CI High']
+
+
+# (replicates, n) row indices: each replicate is a run of randomly placed blocks of consecutive rows
+def block_bootstrap_indices(n, replicates=BOOTSTRAP_REPLICATES, block_length=BLOCK_LENGTH, seed=0):
+    block_length = min(block_length, n)
+    rng = np.random.default_rng(seed)
+    n_blocks = -(-n // block_length)
+    starts = rng.integers(0, n - block_length + 1, size=(replicates, n_blocks))
+    return (starts[:, :, None] + np.arange(block_length)).reshape(replicates, -1)[:, :n]
+
+
+# Fit y = X @ beta for every column of Y and return (beta, draws), where draws has shape
+# (replicates, len(rows), columns). Rows of X come in consecutive groups of group_size
+# (e.g. all modes on one date); residuals are resampled a whole group at a time.
+def bootstrap_ols(X, Y, rows=None, group_size=1, replicates=BOOTSTRAP_REPLICATES,
+                  block_length=BLOCK_LENGTH, seed=0):
+    Y = Y.reshape(len(X), -1)
+    beta, *_ = np.linalg.lstsq(X, Y, rcond=None)
+    fitted = X @ beta
+    resid = (Y - fitted).reshape(len(X) // group_size, group_size, -1)
+
+    idx = block_bootstrap_indices(len(resid), replicates, block_length, seed)
+    Y_star = fitted + resid[idx].reshape(replicates, *Y.shape)
+
+    projection = np.linalg.pinv(X)
+    if rows is not None:
+        projection = projection[rows]
+    return beta, projection @ Y_star
+
+
+def summarize(estimate, draws, level=CI_LEVEL):
+    alpha = (1 - level) / 2
+    low, high = np.quantile(draws, [alpha, 1 - alpha], axis=0)
+    return np.stack([estimate, draws.std(axis=0, ddof=1), low, high], axis=-1)
+
+
+# Segmented regression: intercept, trend, a level and slope change at the intervention date,
+# day-of-week effects and annual Fourier terms (so the January dip is not read as an effect)
+def its_design(dates, intervention_date, harmonics=2):
+    dates = pd.DatetimeIndex(dates)
+    t = np.asarray((dates - dates[0]).days, dtype='float64')
+    post = np.asarray(dates >= intervention_date, dtype='float64')
+    since = post * np.asarray((dates - pd.Timestamp(intervention_date)).days, dtype='float64')
+    weekdays = np.eye(7)[dates.dayofweek][:, 1:]
+    year_fraction = np.asarray(dates.dayofyear, dtype='float64') / 365.25
+    angle = 2 * np.pi * np.outer(year_fraction, np.arange(1, harmonics + 1))
+    return np.column_stack([np.ones_like(t), t, post, since, weekdays, np.sin(angle), np.cos(angle)])
+
+
+ITS_TERMS = ['Level Change', 'Level Change (%)', 'Slope Change (per day)']
+
+
+# Date x mode frame in, (mode, term) x ESTIMATE_COLUMNS frame out. The relative level change
+# divides by the pre-trend's prediction at the intervention date, averaged over weekdays.
+def its_estimates(frame, intervention_date, harmonics=2, replicates=BOOTSTRAP_REPLICATES,
+                  block_length=BLOCK_LENGTH, seed=0):
+    frame = frame.dropna()
+    X = its_design(frame.index, intervention_date, harmonics)
+    beta, draws = bootstrap_ols(X, frame.to_numpy(dtype='float64'), replicates=replicates,
+                                block_length=block_length, seed=seed)
+
+    # pre-trend prediction at the intervention date, with the weekday effects averaged out
+    x0 = X[np.searchsorted(frame.index, pd.Timestamp(intervention_date))].copy()
+    x0[2:4] = 0
+    x0[4:10] = 1 / 7
+
+    def terms(coef):
+        # coef is (..., k, modes); returns (..., modes, terms)
+        baseline = np.einsum('k,...km->...m', x0, coef)
+        return np.stack([coef[..., 2, :], 100 * coef[..., 2, :] / baseline, coef[..., 3, :]], axis=-1)
+
+    table = summarize(terms(beta), terms(draws))
+    index = pd.MultiIndex.from_product([frame.columns, ITS_TERMS], names=['Mode', 'Term'])
+    return pd.DataFrame(table.reshape(-1, len(ESTIMATE_COLUMNS)), index=index, columns=ESTIMATE_COLUMNS)
+
+
+# Two-way fixed effects panel: mode and date effects plus one post-period effect per treated mode.
+# Rows are date-major, so row d * n_modes + j is mode j on date d.
+def did_design(post, treated):
+    post = np.asarray(post, dtype=bool)
+    treated = np.asarray(treated, dtype=bool)
+    n_dates, n_modes = len(post), len(treated)
+    mode_effects = np.tile(np.eye(n_modes), (n_dates, 1))
+    date_effects = np.repeat(np.eye(n_dates)[:, 1:], n_modes, axis=0)
+    effects = (post[:, None] & np.eye(n_modes, dtype=bool)[treated][:, None, :]).transpose(1, 2, 0)
+    return np.column_stack([mode_effects, date_effects, effects.reshape(n_dates * n_modes, -1)])
+
+
+# Effect of the post period on each treated mode relative to the controls, plus their average.
+# pre and post are (start, end) date pairs. With log=True the effects are percent changes.
+def did_estimates(frame, treated, controls, pre, post, log=False, replicates=BOOTSTRAP_REPLICATES,
+                  block_length=BLOCK_LENGTH, seed=0):
+    modes = list(treated) + list(controls)
+    window = pd.concat([frame.loc[pre[0]:pre[1], modes], frame.loc[post[0]:post[1], modes]]).dropna()
+    values = window.to_numpy(dtype='float64')
+    if log:
+        values = np.log(values)
+
+    is_post = window.index >= pd.Timestamp(post[0])
+    X = did_design(is_post, [mode in treated for mode in modes])
+    rows = np.arange(X.shape[1] - len(treated), X.shape[1])
+    beta, draws = bootstrap_ols(X, values.ravel(), rows=rows, group_size=len(modes),
+                                replicates=replicates, block_length=block_length, seed=seed)
+
+    def effects(coef):
+        coef = coef[..., 0]
+        coef = np.concatenate([coef, coef.mean(axis=-1, keepdims=True)], axis=-1)
+        return 100 * np.expm1(coef) if log else coef
+
+    table = summarize(effects(beta[rows]), effects(draws))
+    index = pd.Index(list(treated) + ['Combined'], name='Mode')
+    return pd.DataFrame(table, index=index, columns=ESTIMATE_COLUMNS)
@@ -0,0 +1,55 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from geofence import (CRZ_APPROACHES_PATH, CRZ_BOUNDARY_PATH, ZONE_LABELS, load_approach_areas, load_crz_boundary,
+                      zone_codes)
+
+# Checks that the geofence files put known points in the right area. Run after editing or
+# replacing them (e.g. with the official MTA boundary export):
+#   python check_geofence.py [boundary.geojson] [approaches.geojson]
+# Exits non-zero if any landmark is misclassified.
+
+# (name, lat, lon, expected label) points the geofence files must classify correctly
+LANDMARKS = [
+    ('Battery Park', 40.7033, -74.0170, 'CRZ'),
+    ('Brookfield Place', 40.7130, -74.0155, 'CRZ'),
+    ('Oculus', 40.7115, -74.0110, 'CRZ'),
+    ('Chelsea Market', 40.7424, -74.0061, 'CRZ'),
+    ('Stuyvesant Town', 40.7316, -73.9780, 'CRZ'),
+    ('Empire State Building', 40.7484, -73.9857, 'CRZ'),
+    ('Grand Central', 40.7527, -73.9772, 'CRZ'),
+    ('Times Square', 40.7580, -73.9855, 'CRZ'),
+    ('Sutton Place at 57th St', 40.7573, -73.9597, 'CRZ'),
+    ('Columbus Circle', 40.7681, -73.9819, 'CRZ'),
+    ('West Side Highway at 14th St', 40.7415, -74.0090, 'Outside'),
+    ('West Side Highway at 42nd St', 40.7617, -74.0016, 'Outside'),
+    ('FDR Drive at 34th St', 40.7420, -73.9712, 'Outside'),
+    ('FDR Drive at Houston St', 40.7195, -73.9742, 'Outside'),
+    ('Lincoln Center', 40.7725, -73.9835, 'Outside'),
+    ('Upper East Side at 70th St and York Ave', 40.7660, -73.9530, 'Outside'),
+    ('Roosevelt Island', 40.7570, -73.9520, 'Outside'),
+    ('Hoboken', 40.7440, -74.0320, 'Outside'),
+    ('Court Square', 40.7470, -73.9450, 'Queens'),
+    ('Queensboro Plaza', 40.7505, -73.9400, 'Queens'),
+    ('DUMBO', 40.7033, -73.9881, 'Brooklyn'),
+    ('Brooklyn Heights', 40.6970, -73.9900, 'Brooklyn'),
+]
+
+
+# (name, expected, got) for every landmark the geofence files put in the wrong area
+def check_landmarks(boundary, approaches, landmarks=LANDMARKS):
+    _, lat, lon, expected = zip(*landmarks)
+    labels = np.array(ZONE_LABELS)[zone_codes(lat, lon, boundary, approaches)]
+    return [(name, want, got) for (name, *_, want), got in zip(landmarks, labels) if got != want]
+
+
+if __name__ == '__main__':
+    boundary_path = Path(sys.argv[1]) if len(sys.argv) > 1 else CRZ_BOUNDARY_PATH
+    approaches_path = Path(sys.argv[2]) if len(sys.argv) > 2 else CRZ_APPROACHES_PATH
+    mismatches = check_landmarks(load_crz_boundary(boundary_path), load_approach_areas(approaches_path))
+    for name, expected, got in mismatches:
+        print(f'{name}: expected {expected}, got {got}')
+    print(f'{len(LANDMARKS) - len(mismatches)}/{len(LANDMARKS)} landmarks in the expected area')
+    sys.exit(1 if mismatches else 0)
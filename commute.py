@@ -0,0 +1,298 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from soda_cache import atomic_write_parquet
+from utils import iter_soda_pages, soda_params
+
+BASE_DIR = Path(__file__).parent
+DATA_DIR = BASE_DIR / 'data'
+COMMUTE_SPEEDS_PATH = DATA_DIR / 'commute_speeds.csv'
+SPEED_STORE_DIR = DATA_DIR / 'cache' / 'commute'
+ROUTES_PATH = DATA_DIR / 'unique_routes.csv'
+
+# full EZ-Pass travel time dataset and the fields read from it
+TRAVEL_TIME_URL = 'https://data.cityofnewyork.us/resource/6a2s-2t65.json'
+LINK_COLUMN = 'link_name'
+TIME_COLUMN = 'data_as_of'
+SPEED_COLUMN = 'speed'
+INGEST_START = '2024-07-01T00:00:00' # readers came online in July 2024
+
+# readings on or after this date are treated as congestion pricing being in effect
+CP_START = pd.Timestamp(2024, 12, 31)
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+PERIODS = ['Pre-CP', 'CP in Effect']
+# '%I:%M %p' label for each hour of the day; readings are hourly so minutes are always :00
+HOUR_LABELS = [f"{(hour % 12) or 12:02d}:00 {'AM' if hour < 12 else 'PM'}" for hour in range(24)]
+
+
+# Derive hour/weekday/period columns with whole-column operations instead of per-row Python
+def add_time_features(df):
+    df = df.copy()
+    df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d %H:%M:%S')
+    df['link_name'] = df['link_name'].astype('category')
+
+    hour = df['date'].dt.hour.to_numpy()
+    df['hour'] = hour.astype('int8')
+    df['hour_label'] = pd.Categorical.from_codes(hour, categories=HOUR_LABELS)
+    df['weekday'] = pd.Categorical.from_codes(df['date'].dt.dayofweek.to_numpy(), categories=WEEKDAYS)
+    df['period'] = pd.Categorical.from_codes((df['date'] >= CP_START).to_numpy().astype('int8'),
+                                             categories=PERIODS)
+    return df
+
+
+# mtime is part of the cache key, so features are recomputed only when the file changes
+@st.cache_data
+def load_commute_speeds(path=COMMUTE_SPEEDS_PATH, mtime=None):
+    return add_time_features(pd.read_csv(path, usecols=['link_name', 'date', 'mph']))
+
+
+# Mean/count/variance of hourly speeds over route × weekday × hour × period, held as dense
+# arrays so any chart's data is an index into the cube rather than a pass over raw readings.
+# Sums are kept rather than means so cells can be combined across routes or weekdays.
+class SpeedCube:
+    def __init__(self, routes, total, total_sq, count):
+        self.routes = list(routes)
+        self.total = total
+        self.total_sq = total_sq
+        self.count = count
+        self._route_index = {route: i for i, route in enumerate(self.routes)}
+
+    @classmethod
+    def from_readings(cls, df):
+        # one value per route and timestamp first, then average those over the cube's cells
+        df = df.dropna(subset=['mph'])
+        hourly = df.groupby(['link_name', 'date'], observed=True)['mph'].mean()
+        routes = hourly.index.levels[0]
+        dates = hourly.index.get_level_values('date')
+        mph = hourly.to_numpy()
+
+        shape = (len(routes), len(WEEKDAYS), len(HOUR_LABELS), len(PERIODS))
+        cells = np.ravel_multi_index((hourly.index.codes[0], dates.dayofweek, dates.hour,
+                                      (dates >= CP_START).astype('int8')), shape)
+        size = int(np.prod(shape))
+        total = np.bincount(cells, weights=mph, minlength=size).reshape(shape)
+        total_sq = np.bincount(cells, weights=mph ** 2, minlength=size).reshape(shape)
+        count = np.bincount(cells, minlength=size).reshape(shape)
+        return cls(routes, total, total_sq, count)
+
+    def _select(self, values, index):
+        # None selects every entry on the axis, a single value or a list selects those entries
+        if values is None:
+            return slice(None)
+        if isinstance(values, str):
+            return [index(values)]
+        return [index(value) for value in values]
+
+    # hour × period statistics pooled over the selected routes and weekdays
+    def stats(self, routes=None, weekdays=None):
+        route_idx = self._select(routes, self._route_index.__getitem__)
+        weekday_idx = self._select(weekdays, WEEKDAYS.index)
+        total = self.total[route_idx][:, weekday_idx].sum(axis=(0, 1))
+        total_sq = self.total_sq[route_idx][:, weekday_idx].sum(axis=(0, 1))
+        count = self.count[route_idx][:, weekday_idx].sum(axis=(0, 1))
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = total / count
+            var = np.maximum(total_sq / count - mean ** 2, 0)
+        return mean, var, count
+
+    # long-form chart data for the selection: one row per hour and period with readings
+    def frame(self, routes=None, weekdays=None):
+        mean, var, count = self.stats(routes, weekdays)
+        hour, period = np.meshgrid(np.arange(len(HOUR_LABELS)), np.arange(len(PERIODS)), indexing='ij')
+        frame = pd.DataFrame({
+            'hour': hour.ravel(),
+            'hour_label': np.asarray(HOUR_LABELS)[hour.ravel()],
+            'period': np.asarray(PERIODS)[period.ravel()],
+            'mph': mean.ravel(),
+            'var': var.ravel(),
+            'count': count.ravel(),
+        })
+        return frame[frame['count'] > 0].reset_index(drop=True)
+
+    # merge cubes built over different route sets, e.g. one per store partition
+    @classmethod
+    def combine(cls, cubes):
+        routes = sorted({route for cube in cubes for route in cube.routes})
+        index = {route: i for i, route in enumerate(routes)}
+        shape = (len(routes), len(WEEKDAYS), len(HOUR_LABELS), len(PERIODS))
+        total, total_sq, count = np.zeros(shape), np.zeros(shape), np.zeros(shape, dtype='int64')
+        for cube in cubes:
+            rows = [index[route] for route in cube.routes]
+            np.add.at(total, rows, cube.total)
+            np.add.at(total_sq, rows, cube.total_sq)
+            np.add.at(count, rows, cube.count)
+        return cls(routes, total, total_sq, count)
+
+
+@st.cache_data
+def load_speed_cube(path=COMMUTE_SPEEDS_PATH, mtime=None):
+    return SpeedCube.from_readings(load_commute_speeds(path, mtime))
+
+
+# Decode a column of Google encoded polylines in one pass over its characters. Each character
+# holds 5 bits of a zig-zag encoded delta plus a continuation bit; deltas alternate lat/lon
+# and restart from zero at each route. Returns an (n, 2) array of lon/lat vertices and the
+# route index of each vertex.
+def decode_polylines(encoded, precision=5):
+    encoded = list(encoded)
+    lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+    chars = np.frombuffer(''.join(encoded).encode('ascii'), dtype=np.uint8).astype(np.int64) - 63
+    if chars.size == 0:
+        return np.empty((0, 2)), np.empty(0, dtype=np.int64)
+
+    # a value ends at every character without the continuation bit
+    ends = (chars & 0x20) == 0
+    value_starts = np.flatnonzero(np.concatenate(([True], ends[:-1])))
+    value_id = np.cumsum(np.concatenate(([False], ends[:-1])))
+    shift = 5 * (np.arange(chars.size) - value_starts[value_id])
+    values = np.add.reduceat((chars & 0x1f) << shift, value_starts)
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1).reshape(-1, 2)
+
+    # vertices per route, then a running sum that restarts at each route
+    char_route = np.repeat(np.arange(len(encoded)), lengths)
+    vertex_counts = np.bincount(char_route, weights=ends, minlength=len(encoded)).astype(np.int64) // 2
+    index = np.repeat(np.arange(len(encoded)), vertex_counts)
+    running = np.cumsum(deltas, axis=0)
+    route_starts = np.concatenate(([0], np.cumsum(vertex_counts)[:-1]))
+    before_route = np.vstack([np.zeros((1, 2), dtype=np.int64), running])[route_starts]
+    lat_lon = (running - np.repeat(before_route, vertex_counts, axis=0)) / 10 ** precision
+    return lat_lon[:, ::-1], index
+
+
+# Route geometry from the compact polyline column, without shapely or geopandas.
+# Returns the route names, an (n, 2) array of lon/lat vertices and the route index of each vertex.
+def load_route_geometry(path=ROUTES_PATH):
+    routes = pd.read_csv(path, usecols=['link_name', 'polyline'])
+    coords, index = decode_polylines(routes['polyline'])
+    return routes['link_name'].to_numpy(), coords, index
+
+
+# All routes as a single Scattermapbox trace: a gap (NaN vertex) after each route keeps the lines
+# separate, and every vertex carries its route name for the hover label
+def build_route_map(link_names, coords, index):
+    import plotly.graph_objects as go
+
+    breaks = np.flatnonzero(np.diff(index)) + 1
+    lon = np.insert(coords[:, 0], breaks, np.nan)
+    lat = np.insert(coords[:, 1], breaks, np.nan)
+    text = np.insert(np.asarray(link_names, dtype=object)[index], breaks, None)
+
+    route_map = go.Figure(go.Scattermapbox(
+        lon=lon,
+        lat=lat,
+        mode='lines',
+        line=dict(width=4),
+        text=text,
+        hovertemplate="%{text}<extra></extra>"
+    ))
+    route_map.update_layout(
+        mapbox_style="carto-positron",
+        mapbox_zoom=11.7,
+        mapbox_center={"lat": 40.75, "lon": -73.985},
+        margin={"r": 0, "t": 0, "l": 0, "b": 0},
+        height=500,
+        width=400,
+        showlegend=False
+    )
+    return route_map
+
+
+@st.cache_data
+def load_route_map(path=ROUTES_PATH, mtime=None):
+    return build_route_map(*load_route_geometry(path))
+
+
+# Speed store: hourly speed sums and counts per link, one parquet file per month.
+# Sums are stored instead of means so a month can be extended without re-reading raw readings.
+
+def _month_path(month, store_dir=SPEED_STORE_DIR):
+    return store_dir / f'{month.year}-{month.month:02d}.parquet'
+
+
+# newest hour in the store, or None for an empty store
+def store_watermark(store_dir=SPEED_STORE_DIR):
+    partitions = sorted(store_dir.glob('*.parquet'))
+    if not partitions:
+        return None
+    return pd.read_parquet(partitions[-1], columns=['date'])['date'].max()
+
+
+def aggregate_chunk(chunk):
+    readings = pd.DataFrame({
+        'link_name': chunk[LINK_COLUMN],
+        'date': pd.to_datetime(chunk[TIME_COLUMN], errors='coerce').dt.floor('h'),
+        'mph': pd.to_numeric(chunk[SPEED_COLUMN], errors='coerce'),
+    }).dropna()
+    return (readings
+            .groupby(['link_name', 'date'])['mph']
+            .agg(mph_sum='sum', n='size')
+            .reset_index())
+
+
+def _write_month(month, parts, watermark, store_dir=SPEED_STORE_DIR):
+    path = _month_path(month, store_dir)
+    if path.exists():
+        existing = pd.read_parquet(path)
+        # the hour at the watermark may have been partial and is being re-ingested in full
+        if watermark is not None:
+            existing = existing[existing['date'] < watermark]
+        parts = [existing] + parts
+    month_df = (pd.concat(parts, ignore_index=True)
+                .groupby(['link_name', 'date'], as_index=False)[['mph_sum', 'n']]
+                .sum()
+                .astype({'n': 'int32'}))
+    atomic_write_parquet(month_df, path)
+
+
+# Pull readings newer than the store's watermark in pages ordered by time, aggregate each page
+# to hourly sums, and write a month's partition as soon as the pages move past it. Memory holds
+# one page plus at most one month of hourly aggregates however large the dataset is.
+def ingest_travel_times(url=TRAVEL_TIME_URL, start=INGEST_START, store_dir=SPEED_STORE_DIR, page_size=50000):
+    store_dir.mkdir(parents=True, exist_ok=True)
+    watermark = store_watermark(store_dir)
+    since = watermark if watermark is not None else pd.Timestamp(start)
+    params = soda_params(select=[LINK_COLUMN, TIME_COLUMN, SPEED_COLUMN],
+                         where=f"{TIME_COLUMN} >= '{since:%Y-%m-%dT%H:%M:%S}'",
+                         order=f'{TIME_COLUMN}, :id')
+
+    pending = {}
+    written = []
+    for chunk in iter_soda_pages(url, params, page_size=page_size):
+        if chunk.empty:
+            continue
+        hourly = aggregate_chunk(chunk)
+        for month, part in hourly.groupby(hourly['date'].dt.to_period('M')):
+            pending.setdefault(month, []).append(part)
+        # pages arrive in time order, so every month before the newest one is complete
+        for month in sorted(pending)[:-1]:
+            _write_month(month, pending.pop(month), watermark, store_dir)
+            written.append(month)
+    for month in sorted(pending):
+        _write_month(month, pending.pop(month), watermark, store_dir)
+        written.append(month)
+    return written
+
+
+# readings from the store in the same shape as commute_speeds.csv
+def read_speed_store(path):
+    month_df = pd.read_parquet(path)
+    return pd.DataFrame({'link_name': month_df['link_name'],
+                         'date': month_df['date'],
+                         'mph': month_df['mph_sum'] / month_df['n']})
+
+
+# one cube per partition, merged, so the store is never loaded into memory at once
+@st.cache_data
+def load_store_speed_cube(store_dir=SPEED_STORE_DIR, version=None):
+    return SpeedCube.combine([SpeedCube.from_readings(add_time_features(read_speed_store(path)))
+                              for path in sorted(store_dir.glob('*.parquet'))])
+
+
+if __name__ == '__main__':
+    months = ingest_travel_times()
+    print(f'Wrote {len(months)} month partition(s) to {SPEED_STORE_DIR}')
@@ -0,0 +1,84 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import shapely
+import streamlit as st
+from shapely.geometry import shape
+
+BASE_DIR = Path(__file__).parent
+CRZ_BOUNDARY_PATH = BASE_DIR / 'data' / 'crz_boundary.geojson'
+CRZ_APPROACHES_PATH = BASE_DIR / 'data' / 'crz_approaches.geojson'
+
+# Approach areas from the outer boroughs, which the collision analysis counts alongside the zone
+# itself. Each is a polygon in CRZ_APPROACHES_PATH traced along the far shore of the East River,
+# so no approach area reaches into Manhattan:
+#   Queens: Long Island City and east of Queensboro Bridge
+#   Brooklyn: DUMBO, Brooklyn Heights, near Brooklyn Bridge
+APPROACH_NAMES = ['Queens', 'Brooklyn']
+
+# zone codes: 0 is outside every area, then the zone itself, then each approach area
+ZONE_LABELS = ['Outside', 'CRZ'] + APPROACH_NAMES
+
+def _read_features(path):
+    with open(path) as f:
+        return json.load(f)['features']
+
+
+# The zone polygon(s) from the GeoJSON, minus the features marked "role": "exclude" (the FDR
+# Drive, West Side Highway, Battery Park Underpass and Hugh L. Carey Tunnel approach, which are
+# not part of the zone), prepared so repeated containment tests skip rebuilding the edge index.
+# Shared by every session and reloaded only when the file changes.
+@st.cache_resource
+def load_crz_boundary(path=CRZ_BOUNDARY_PATH, mtime=None):
+    features = _read_features(path)
+    zone = shapely.union_all([shape(f['geometry']) for f in features
+                              if f.get('properties', {}).get('role') != 'exclude'])
+    excluded = [shape(f['geometry']) for f in features if f.get('properties', {}).get('role') == 'exclude']
+    boundary = zone.difference(shapely.union_all(excluded)) if excluded else zone
+    shapely.prepare(boundary)
+    return boundary
+
+
+# Approach polygons by name, in APPROACH_NAMES order
+@st.cache_resource
+def load_approach_areas(path=CRZ_APPROACHES_PATH, mtime=None):
+    areas = {f['properties']['name']: shape(f['geometry']) for f in _read_features(path)}
+    areas = {name: areas[name] for name in APPROACH_NAMES}
+    for area in areas.values():
+        shapely.prepare(area)
+    return areas
+
+
+def boundary_box(boundary):
+    lon_min, lat_min, lon_max, lat_max = boundary.bounds
+    return (lat_min, lat_max, lon_min, lon_max)
+
+
+# Boxes to filter on server-side: the bounding boxes of the zone and of each approach area
+def query_boxes(boundary, approaches):
+    return [boundary_box(boundary)] + [boundary_box(area) for area in approaches.values()]
+
+
+# Zone code per point (see ZONE_LABELS), from one vectorized point-in-polygon test per area
+def zone_codes(latitude, longitude, boundary, approaches):
+    lat = np.asarray(latitude, dtype='float64')
+    lon = np.asarray(longitude, dtype='float64')
+
+    codes = np.zeros(len(lat), dtype='int8')
+    for code, area in enumerate(approaches.values(), 2):
+        codes[shapely.contains_xy(area, lon, lat)] = code
+    # the zone wins should an approach area ever overlap it
+    codes[shapely.contains_xy(boundary, lon, lat)] = 1
+    return codes
+
+
+# Categorical zone label per point, cached on the coordinates themselves (numpy arrays hash
+# quickly), so reruns over the same crash frame skip the containment tests
+@st.cache_data
+def crz_zone_labels(latitude, longitude, path=CRZ_BOUNDARY_PATH, mtime=None,
+                    approaches_path=CRZ_APPROACHES_PATH, approaches_mtime=None):
+    codes = zone_codes(latitude, longitude, load_crz_boundary(path, mtime),
+                       load_approach_areas(approaches_path, approaches_mtime))
+    return pd.Categorical.from_codes(codes, categories=ZONE_LABELS)
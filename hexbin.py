@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Fixed hexagonal grid for aggregating points server-side, so maps receive one row per cell
+# instead of one per point. Flat-top hexagons in a local equirectangular projection, matching
+# the cells pydeck's ColumnLayer draws with disk_resolution=6.
+
+HEX_RADIUS_M = 200  # centre-to-corner distance in metres
+GRID_ORIGIN = (40.74, -73.985)  # (lat, lon) the projection is centred on
+EARTH_RADIUS_M = 6371008.8
+
+SQRT3 = np.sqrt(3)
+
+
+def _metres_per_degree(origin=GRID_ORIGIN):
+    lat_scale = np.pi / 180 * EARTH_RADIUS_M
+    return lat_scale, lat_scale * np.cos(np.radians(origin[0]))
+
+
+# (q, r) axial coordinates of the cell holding each point
+def hex_cells(latitude, longitude, radius=HEX_RADIUS_M, origin=GRID_ORIGIN):
+    lat_scale, lon_scale = _metres_per_degree(origin)
+    x = (np.asarray(longitude, dtype='float64') - origin[1]) * lon_scale / radius
+    y = (np.asarray(latitude, dtype='float64') - origin[0]) * lat_scale / radius
+
+    # fractional cube coordinates, rounded to the nearest cell centre
+    q = 2 / 3 * x
+    r = -x / 3 + SQRT3 / 3 * y
+    s = -q - r
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return rq.astype('int32'), rr.astype('int32')
+
+
+# (lat, lon) of each cell centre
+def hex_centers(q, r, radius=HEX_RADIUS_M, origin=GRID_ORIGIN):
+    lat_scale, lon_scale = _metres_per_degree(origin)
+    x = radius * 1.5 * np.asarray(q)
+    y = radius * SQRT3 * (np.asarray(r) + np.asarray(q) / 2)
+    return origin[0] + y / lat_scale, origin[1] + x / lon_scale
+
+
+# Point counts per (year, month, cell), with cell centres. Keys are packed into one int64 so the
+# grouping is a single 1D np.unique.
+def bin_counts(latitude, longitude, year, month, radius=HEX_RADIUS_M, origin=GRID_ORIGIN):
+    q, r = hex_cells(latitude, longitude, radius, origin)
+    period = np.asarray(year, dtype='int64') * 12 + np.asarray(month, dtype='int64') - 1
+    keys = (period << 32) | ((q.astype('int64') & 0xFFFF) << 16) | (r.astype('int64') & 0xFFFF)
+    keys, counts = np.unique(keys, return_counts=True)
+
+    # unpack, restoring the sign of the 16-bit cell coordinates
+    q = ((keys >> 16) & 0xFFFF).astype('uint16').view('int16').astype('int32')
+    r = (keys & 0xFFFF).astype('uint16').view('int16').astype('int32')
+    period = keys >> 32
+    lat, lon = hex_centers(q, r, radius, origin)
+    return pd.DataFrame({'year': (period // 12).astype('int16'), 'month': (period % 12 + 1).astype('int8'),
+                         'q': q, 'r': r, 'latitude': lat, 'longitude': lon, 'count': counts.astype('int32')})
+
+
+@st.cache_data
+def load_hex_counts(latitude, longitude, year, month, radius=HEX_RADIUS_M):
+    return bin_counts(latitude, longitude, year, month, radius)
+
+
+def month_bins(counts, year, month):
+    return counts[(counts['year'] == year) & (counts['month'] == month)].reset_index(drop=True)
+
+
+# Cell-by-cell change from year_a to year_b for one month; cells missing in one year count as 0
+def difference_bins(counts, month, year_a, year_b):
+    cells = ['q', 'r', 'latitude', 'longitude']
+    a = month_bins(counts, year_a, month)[cells + ['count']]
+    b = month_bins(counts, year_b, month)[cells + ['count']]
+    merged = a.merge(b, on=cells, how='outer', suffixes=(f'_{year_a}', f'_{year_b}'))
+    for year in (year_a, year_b):
+        merged[f'count_{year}'] = merged[f'count_{year}'].fillna(0).astype('int32')
+    merged['change'] = merged[f'count_{year_b}'] - merged[f'count_{year_a}']
+    return merged
+
+
+# RGBA per cell with opacity proportional to value / scale, for pydeck's get_fill_color
+def fill_colors(values, rgb, scale, min_alpha=40, max_alpha=220):
+    values = np.asarray(values, dtype='float64')
+    alpha = min_alpha + (max_alpha - min_alpha) * np.clip(values / max(scale, 1), 0, 1)
+    return [[*rgb, int(a)] for a in alpha]
+
+
+# increases in red, decreases in blue, both scaled by the largest absolute change; cells with
+# no change are a faint neutral gray
+def change_colors(change, increase=(255, 50, 50), decrease=(0, 100, 255), unchanged=(160, 160, 160)):
+    change = np.asarray(change, dtype='float64')
+    scale = np.abs(change).max(initial=1)
+    return [[*(increase if c > 0 else decrease if c < 0 else unchanged), int(40 + 180 * abs(c) / scale)]
+            for c in change]
@@ -1,105 +1,31 @@
+import os
+import sys
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
-from pathlib import Path
 import numpy as np
 
-BASE_DIR = Path(__file__).parent.parent
-DATA_DIR = BASE_DIR / 'data'
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from budget_graph import BUDGET_PATH, load_budget_sankey
+from revenue import (DEFAULT_ASSUMPTIONS, ENTRIES_PATH, ENTRIES_STORE_DIR, load_baseline_total, load_entries,
+                     load_revenue_rollup, scenario_sweep, toll_rate_table)
+from soda_cache import store_version
+from utils import lazy_import, show_import_profile
+
+px = lazy_import('plotly.express')
+go = lazy_import('plotly.graph_objects')
 
 # Load multiple files
-budget = pd.read_excel(DATA_DIR / 'arb_budget.xlsx')
-entries = pd.read_csv(DATA_DIR / 'vehicle_entries_grouped.csv')
+# entries ingested from the live MTA export (python revenue.py) take precedence over the
+# hand-exported CSV; either way the data version keys the caches
+entries_version = store_version(ENTRIES_STORE_DIR)
+if entries_version is not None:
+    entries_source = ENTRIES_STORE_DIR
+else:
+    entries_source, entries_version = ENTRIES_PATH, ENTRIES_PATH.stat().st_mtime
+revenue_rollup = load_revenue_rollup(entries_source, entries_version)
 
 # Sankey Diagram
-
-# Step 1: Get all labels (already done)
-labels = pd.unique(budget[["Category 1", "Category 2", "Category 3"]].values.ravel()).tolist()
-label_map = {label: i for i, label in enumerate(labels)}
-
-# Step 2: Compute total flow per node (both incoming and outgoing)
-n_nodes = len(labels)
-incoming_values = np.zeros(n_nodes)
-outgoing_values = np.zeros(n_nodes)
-# Link: Category 1 → Category 2
-df_l1_l2 = budget.groupby(["Category 1", "Category 2"])["Budget"].sum().reset_index()
-df_l1_l2["source"] = df_l1_l2["Category 1"].map(label_map)
-df_l1_l2["target"] = df_l1_l2["Category 2"].map(label_map)
-
-# Only keep descriptions for valid Category 2 → Category 3 flows
-df_valid = budget.dropna(subset=["Category 3"]).copy()
-df_valid["source"] = df_valid["Category 2"].map(label_map)
-df_valid["target"] = df_valid["Category 3"].map(label_map)
-
-def insert_line_breaks(text, max_len=30):
-    words = text.split()
-    lines, current = [], ""
-    for word in words:
-        if len(current) + len(word) + 1 > max_len:
-            lines.append(current)
-            current = word
-        else:
-            current += (" " if current else "") + word
-    lines.append(current)
-    return "<br>".join(lines)
-
-df_valid["Description"] = df_valid["Description"].apply(insert_line_breaks)
-
-# Use empty strings for the Category 1 → 2 links (no descriptions)
-df_l1_l2["Description"] = ""
-
-# Combine sources, targets, values, and descriptions
-source_nodes = pd.concat([df_l1_l2["source"], df_valid["source"]])
-target_nodes = pd.concat([df_l1_l2["target"], df_valid["target"]])
-values = pd.concat([df_l1_l2["Budget"], df_valid["Budget"]])
-hover_text = pd.concat([df_l1_l2["Description"], df_valid["Description"]])
-
-for t, v in zip(target_nodes, values):
-    incoming_values[t] += v
-for s, v in zip(source_nodes, values):
-    outgoing_values[s] += v
-
-# Final node budget: if no incoming, use outgoing
-node_budget_values = [
-    incoming_values[i] if incoming_values[i] > 0 else outgoing_values[i]
-    for i in range(n_nodes)
-]
-
-def format_value(val):
-    if val >= 1e9:
-        return f"${val / 1e9:.2f}B"
-    elif val >= 1e6:
-        return f"${val / 1e6:.0f}M"
-    else:
-        return f"${val:,.0f}"
-    
-node_hover_text = [
-    f"<b>{label}</b><br>Total Budget: {format_value(node_budget_values[i])}"
-    for i, label in enumerate(labels)
-]
-
-# Sankey plot
-sankey = go.Figure(data=[go.Sankey(
-    arrangement='snap',
-    node=dict(
-        pad=10,
-        thickness=20,
-        line=dict(color="black", width=0.5),
-        label=labels,
-        customdata=node_hover_text,
-        hovertemplate="%{customdata}<extra></extra>",
-    ),
-    link=dict(
-        source=source_nodes,
-        target=target_nodes,
-        value=values,
-        customdata=hover_text,
-        hovertemplate='%{customdata}<extra></extra>'
-    )
-)])
-
-sankey.update_layout(font_family = 'Arial', height=600, font_size=14)
+sankey = load_budget_sankey(BUDGET_PATH, BUDGET_PATH.stat().st_mtime)
 
 st.title('CRZ Revenue')
 mta_info = 'https://www.mta.info/fares-tolls/tolls/congestion-relief-zone/better-transit'
@@ -116,18 +42,7 @@ st.markdown('''
 
 st.plotly_chart(sankey)
 
-toll_data = [
-    ['Passenger Cars & Vans', '$9.00', '$2.25', ''], 
-    ['Single-Unit Trucks', '$14.40', '$3.60', ''],
-    ['Multi-Unit Trucks', '$21.60', '$5.40', ''],
-    ['Sightseeing Buses', '$21.60', '$5.40', ''],
-    ['Other Buses', '$14.40', '$3.60', ''],
-    ['Motorcycles', '$4.50', '$1.05'],
-    ['TLC Taxi', '', '', '$0.75'],
-    ['App-based FHV', '', '', '$1.50']
-]
-
-toll_rates = pd.DataFrame(toll_data, columns=['Vehicle Class', 'Peak', 'Overnight', 'Per Trip']).set_index('Vehicle Class')
+toll_rates = toll_rate_table()
 
 st.markdown('''
     Revenue estimates from the cordon pricing program are below. Actual revenue numbers have not yet been
@@ -150,40 +65,71 @@ st.markdown('''
     to MTA projects.
 ''')
 
-revenue_sum = entries['Estimated Revenue'].sum()
-st.subheader(f'Estimated Revenue (as of 4/12/25): ${revenue_sum:,.0f}')
+first_day, last_day = pd.Timestamp(revenue_rollup.start), pd.Timestamp(revenue_rollup.end)
+revenue_sum = revenue_rollup.total()
+st.subheader(f'Estimated Revenue (as of {last_day.month}/{last_day.day}/{last_day:%y}): ${revenue_sum:,.0f}')
 
 view_choice = st.selectbox('Select view', ['By Vehicle Class', 'By Period'])
-
-entries['Toll Date'] = pd.to_datetime(entries['Toll Date'])
-
-if view_choice == 'By Vehicle Class':
-    rev_group = (entries
-                    .groupby(['Toll Date', 'Day of Week', 'Toll Week', 'Vehicle Class'])['Estimated Revenue']
-                    .sum()
-                    .reset_index())
-    line_plot = px.bar(rev_group, x = 'Toll Date', y = 'Estimated Revenue', 
-                       color = 'Vehicle Class',
-                       custom_data = ['Vehicle Class'],
-                       category_orders={'Vehicle Class': ['Passenger Cars & Vans', 'TLC Taxi/FHV',
-                                                          'Single-Unit Trucks', 'Buses', 'Multi-Unit Trucks',
-                                                          'Motorcycles']})
-    line_plot.update_layout(xaxis_title='', font_family='Arial', height = 500)
-    line_plot.update_traces(hovertemplate = '''
-                            <b>%{x}</b><br><br><b>%{customdata[0]}</b>
-                            <br>$%{y:,.2f}<extra></extra>''')
-
-else:
-    rev_group = (entries
-                    .groupby(['Toll Date', 'Day of Week', 'Toll Week', 'Time Period'])['Estimated Revenue']
-                    .sum()
-                    .reset_index())
-    line_plot = px.bar(rev_group, x = 'Toll Date', y = 'Estimated Revenue', 
-                       color = 'Time Period', custom_data = ['Time Period'],
-                       category_orders = {'Time Period': ['Peak', 'Overnight']})
-    line_plot.update_layout(xaxis_title='', font_family='Arial', height = 500)
-    line_plot.update_traces(hovertemplate = '''
-                            <b>%{x}</b><br><br><b>%{customdata[0]}</b>
-                            <br>$%{y:,.2f}<extra></extra>''')
-
-st.plotly_chart(line_plot)
\ No newline at end of file
+date_range = st.slider('Select date range', min_value=first_day.date(), max_value=last_day.date(),
+                       value=(first_day.date(), last_day.date()), format='MM/DD/YY')
+st.caption(f'Estimated revenue for the selected dates: ${revenue_rollup.total(*date_range):,.0f}')
+
+# daily totals come from the precomputed rollup rather than a groupby over the entries
+group_col = 'Vehicle Class' if view_choice == 'By Vehicle Class' else 'Time Period'
+rev_group = revenue_rollup.daily_frame(group_col, *date_range)
+line_plot = px.bar(rev_group, x = 'Toll Date', y = 'Estimated Revenue',
+                   color = group_col,
+                   custom_data = [group_col],
+                   category_orders={group_col: revenue_rollup.groups[group_col]})
+line_plot.update_layout(xaxis_title='', font_family='Arial', height = 500)
+line_plot.update_traces(hovertemplate = '''
+                        <b>%{x}</b><br><br><b>%{customdata[0]}</b>
+                        <br>$%{y:,.2f}<extra></extra>''')
+
+st.plotly_chart(line_plot)
+
+# Scenario total and a +/-50% sensitivity sweep around the chosen assumptions (shares capped at
+# 100%), cached per entries version and assumption values. Every combination is evaluated in one
+# batched array operation; the sweep is binned here, so the chart only carries the bin counts.
+@st.cache_data
+def assumption_sweep(entries_source, entries_version, assumptions, bins=60):
+    entries, rates = load_entries(entries_source, entries_version), toll_rate_table()
+    scenario_total = scenario_sweep(entries, rates, **assumptions)['Estimated Revenue'].iloc[0]
+
+    grids = {name: np.linspace(0.5 * value, 1.5 * value, 9) for name, value in assumptions.items()}
+    grids = {name: grid if name == 'rides_per_vehicle' else np.unique(np.clip(grid, 0, 1))
+             for name, grid in grids.items()}
+    totals = scenario_sweep(entries, rates, **grids)['Estimated Revenue'].to_numpy()
+    counts, edges = np.histogram(totals, bins=bins)
+    sweep_plot = go.Figure(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges),
+                                  hovertemplate='$%{x:,.0f}<br>%{y} scenarios<extra></extra>'))
+    sweep_plot.update_layout(font_family='Arial', height=350, xaxis_title='Estimated Revenue',
+                             yaxis_title='Scenarios', bargap=0)
+    return scenario_total, len(totals), np.percentile(totals, [5, 50, 95]), sweep_plot
+
+with st.expander('Explore revenue assumptions'):
+    col1, col2 = st.columns(2)
+    assumptions = {
+        'sightseeing_bus_share': col1.slider('Sightseeing share of buses', 0.0, 0.5,
+                                             DEFAULT_ASSUMPTIONS['sightseeing_bus_share'], 0.01),
+        'fhv_share': col1.slider('App-based FHV share of TLC entries', 0.0, 1.0,
+                                 DEFAULT_ASSUMPTIONS['fhv_share'], 0.05),
+        'rides_per_vehicle': col1.slider('Rides per TLC vehicle', 1, 20, DEFAULT_ASSUMPTIONS['rides_per_vehicle']),
+        'credit_reduction': col2.slider('Credit and discount reduction', 0.0, 0.5,
+                                        DEFAULT_ASSUMPTIONS['credit_reduction'], 0.01),
+        'mta_share': col2.slider('Share attributed to MTA projects', 0.5, 1.0,
+                                 DEFAULT_ASSUMPTIONS['mta_share'], 0.05),
+    }
+    scenario_total, n_scenarios, (low, mid, high), sweep_plot = assumption_sweep(entries_source, entries_version,
+                                                                                 assumptions)
+    # the delta is against the same model at the default assumptions (not the rounded rollup
+    # total), so the defaults show no change
+    baseline_total = load_baseline_total(entries_source, entries_version)
+    st.metric('Estimated revenue under these assumptions', f'${scenario_total:,.0f}',
+              delta=f'{scenario_total - baseline_total:,.0f}')
+
+    st.plotly_chart(sweep_plot)
+    st.caption(f'{n_scenarios:,} scenarios with each assumption varied by up to ±50%. '
+               f'5th–95th percentile: ${low:,.0f} – ${high:,.0f} (median ${mid:,.0f}).')
+
+show_import_profile()
@@ -1,61 +1,47 @@
+import os
+import sys
 import pandas as pd
-import plotly.graph_objects as go
 import streamlit as st
-import datetime
-
-dfs = []
-
-now = datetime.datetime.now()
-current_month = now.month
-
-for year in [2022, 2023, 2024, 2025]:
-    if year == 2025:
-        for month in range(1,current_month+1):  
-            url = f'https://azdohv2staticweb.blob.core.windows.net/$web/hist/csv/{year}/{month}/hourlyMonitoring.csv'
-            dfs.append(pd.read_csv(url))
-    else:
-        for month in range(1,13):
-            url = f'https://azdohv2staticweb.blob.core.windows.net/$web/hist/csv/{year}/{month}/hourlyMonitoring.csv'
-            dfs.append(pd.read_csv(url))
-
-# Concatenate all data into one DataFrame
-combined_df = pd.concat(dfs, ignore_index=True)
-combined_df['ObservationTimeUTC'] = pd.to_datetime(combined_df['ObservationTimeUTC'])
-
-siteinfo = pd.read_csv('https://azdohv2staticweb.blob.core.windows.net/$web/hist/csv/location.csv')
-combined_df = combined_df.merge(siteinfo, on = 'SiteID')
-
-combined_df['Date'] = combined_df.ObservationTimeUTC.dt.date
-combined_df['Hour'] = combined_df.ObservationTimeUTC.dt.hour
-combined_df['Year'] = combined_df.ObservationTimeUTC.dt.year
-combined_df['Month'] = combined_df.ObservationTimeUTC.dt.month
-combined_df['Day'] = combined_df.ObservationTimeUTC.dt.day
-
-iso = combined_df['ObservationTimeUTC'].dt.isocalendar()  # Returns a DataFrame with year, week, and weekday
-combined_df['iso_year'] = iso['year']
-combined_df['iso_week'] = iso['week']
-combined_df['iso_weekday'] = iso['day']  # Monday=1, Sunday=7
-
-for col in combined_df.columns:
-    if 'no data available' in col:
-        combined_df = combined_df.drop(columns = col)
-
-# we want to compare full ISO weeks across years. If current data has incomplete data for the week,
-# use previous week as most recent. Data will update Monday morning with previous ISO week.
-
-# week_no: dataframe's lastest iso_week
-week_no = combined_df.loc[combined_df.Date == combined_df.Date.max()].iso_week.unique()[0]
-
-most_recent_weekday = (combined_df.loc[
-                           (combined_df.iso_year == combined_df.iso_year.max()) & 
-                           (combined_df.iso_week == week_no)].iso_weekday.max())
-
-# week_df: pull data from each year for the appropriate iso_week
-# data has hourly frequency. most granular YoY comparison.
-if most_recent_weekday == 7:        
-    week_df = combined_df.loc[combined_df.iso_week == week_no]
-else:
-    week_df = combined_df.loc[combined_df.iso_week == week_no - 1]
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from air_quality import read_store, refresh_store, store_partitions
+from utils import lazy_import, show_import_profile
+
+go = lazy_import('plotly.graph_objects')
+
+WEEK_COLUMNS = ['ObservationTimeUTC', 'Value', 'SiteName', 'Latitude', 'Longitude',
+                'Date', 'Year', 'iso_year', 'iso_week']
+
+# the refresh only appends months missing from the local store (plus the current month),
+# then every read below pulls just the columns and ISO weeks that are plotted
+@st.cache_data(ttl=3600) # Cache data for 1 hour
+def load_air_quality():
+    refresh_store()
+
+    # we want to compare full ISO weeks across years. If current data has incomplete data for the week,
+    # use previous week as most recent. Data will update Monday morning with previous ISO week.
+    latest = read_store(columns=['Date', 'iso_year', 'iso_week', 'iso_weekday'],
+                        partitions=store_partitions()[-1:])
+
+    # week_no: dataframe's lastest iso_week
+    week_no = int(latest.loc[latest.Date == latest.Date.max()].iso_week.unique()[0])
+
+    most_recent_weekday = (latest.loc[
+                               (latest.iso_year == latest.iso_year.max()) &
+                               (latest.iso_week == week_no)].iso_weekday.max())
+
+    # week_df: pull data from each year for the appropriate iso_week
+    # data has hourly frequency. most granular YoY comparison.
+    target_week = week_no if most_recent_weekday == 7 else week_no - 1
+    week_df = read_store(columns=WEEK_COLUMNS, filters=[('iso_week', '==', target_week)])
+
+    # year-to-date weekly values, through the latest iso_week
+    ytd_df = read_store(columns=['SiteName', 'iso_year', 'iso_week', 'Value'],
+                        filters=[('iso_week', '<=', week_no)])
+
+    return week_no, week_df, ytd_df
+
+week_no, week_df, ytd_df = load_air_quality()
 
 last7days = go.Figure()
 
@@ -185,14 +171,13 @@ aqi_map.update_layout(
 
 # plot YTD comparisons
 
-all_site_avg = combined_df[['iso_year', 'iso_week', 'Value']].groupby(['iso_year', 'iso_week']).mean().reset_index()
+all_site_avg = ytd_df[['iso_year', 'iso_week', 'Value']].groupby(['iso_year', 'iso_week']).mean().reset_index()
 all_site_avg['SiteName'] = 'All Sites (Average)'
 
 # ytd: iso_week average aqi per site per year.
 # date range of data is jan 1 - current iso_week (ytd)
-ytd = combined_df[['SiteName', 'iso_year', 'iso_week', 'Value']].groupby(['SiteName', 'iso_year', 'iso_week']).mean().reset_index()
+ytd = ytd_df.groupby(['SiteName', 'iso_year', 'iso_week'])['Value'].mean().reset_index()
 ytd = pd.concat([ytd, all_site_avg], ignore_index=True)
-ytd = ytd.loc[ytd.iso_week.isin(range(week_no+1))].reset_index(drop=True)
 
 # Get the sorted list of unique years (for consistent color/ordering)
 years = sorted(ytd['iso_year'].unique())
@@ -203,7 +188,9 @@ site_options = sorted(ytd.SiteName.unique())
 traces = []
 site_trace_indices = {}
 
-colors = {2022: '#FCD0A1', 2023: '#B1B695', 2024: '#A690A4', 2025: '#5E4B56'}
+# one palette color per year by position, cycling if the archive outgrows the palette
+palette = ['#FCD0A1', '#B1B695', '#A690A4', '#5E4B56', '#2E1F27']
+colors = {year: palette[i % len(palette)] for i, year in enumerate(years)}
 
 for site in site_options:
     indices = []
@@ -318,4 +305,6 @@ st.caption('''
     air quality was already improving between 2023 and 2024.
     * Further analysis required to determine causal relationship between the introduction of congestion pricing
     and reduction in PM2.5.
-''')
\ No newline at end of file
+''')
+
+show_import_profile()
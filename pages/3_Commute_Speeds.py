@@ -1,17 +1,15 @@
-import requests
+import os
+import sys
 import pandas as pd
-from datetime import datetime, timedelta
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import streamlit as st
-import polyline
-import plotly.express as px
-from shapely.geometry import LineString
-from pathlib import Path
-import plotly.graph_objects as go
-import geopandas as gpd
-from shapely import wkt
 
-# url = 'https://data.cityofnewyork.us/resource/6a2s-2t65.json'
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from commute import (COMMUTE_SPEEDS_PATH, ROUTES_PATH, SPEED_STORE_DIR, WEEKDAYS, load_route_map, load_speed_cube,
+                     load_store_speed_cube)
+from soda_cache import store_version
+from utils import lazy_import, show_import_profile
+
+px = lazy_import('plotly.express')
 
 keep = ['3rd Avenue - Northbound - 49th St to 57th St',
         '8th Avenue - Northbound - 23rd St to 34th St',
@@ -23,38 +21,17 @@ keep = ['3rd Avenue - Northbound - 49th St to 57th St',
         '23rd Street - Westbound - 6th Ave to 7th Ave',
         '34th Street - Westbound - 3rd Ave to Madison Ave']
 
-BASE_DIR = Path(__file__).parent.parent
-DATA_DIR = BASE_DIR / 'data'
-
 # Load multiple files
-commute_speeds = pd.read_csv(DATA_DIR / 'commute_speeds.csv')
-unique_routes = pd.read_csv(DATA_DIR / 'unique_routes.csv')
-unique_routes['geometry'] = unique_routes['geometry'].apply(wkt.loads)
-unique_routes = gpd.GeoDataFrame(unique_routes, geometry='geometry', crs="EPSG:4326")
-
-traces=[]
-for i, row in unique_routes.iterrows():
-    lons, lats = map(list, row['geometry'].xy)
-    
-    traces.append(go.Scattermapbox(
-        lon=lons,
-        lat=lats,
-        mode='lines',
-        text = [row['link_name']] * len(lons),
-        hovertemplate = "%{text}<extra></extra>"
-    ))
-    
-route_map = go.Figure(data=traces)
-
-route_map.update_layout(
-    mapbox_style="carto-positron",
-    mapbox_zoom=11.7,
-    mapbox_center={"lat": 40.75, "lon": -73.985},
-    margin={"r": 0, "t": 0, "l": 0, "b": 0},
-    height=500,
-    width=400,
-    showlegend=False
-)
+# use the full travel time store when the ingestion job (python commute.py) has populated it,
+# otherwise fall back to the hand-made extract of the routes in keep
+speed_version = store_version(SPEED_STORE_DIR)
+if speed_version is not None:
+    speed_cube = load_store_speed_cube(version=speed_version)
+    route_options = speed_cube.routes
+else:
+    speed_cube = load_speed_cube(COMMUTE_SPEEDS_PATH, COMMUTE_SPEEDS_PATH.stat().st_mtime)
+    route_options = keep
+route_map = load_route_map(ROUTES_PATH, ROUTES_PATH.stat().st_mtime)
 
 st.title('Commute Times')
 
@@ -83,42 +60,16 @@ st.markdown(
 col3, col4 = st.columns(2)
 route_choice = col3.selectbox(
     'Select route',
-    keep
+    route_options
 )
 
 day_choice = col4.selectbox(
     'Select day of week',
-    ('Monday', 'Tuesday', 'Wednesday', 
-    'Thursday', 'Friday', 'Saturday', 'Sunday')
+    WEEKDAYS + ['All week']
 )
 
-commute_speeds['date'] = pd.to_datetime(commute_speeds['date'])
-commute_speeds['hour'] = commute_speeds['date'].dt.hour
-commute_speeds['hour_label'] = commute_speeds['date'].apply(lambda x: x.strftime('%I:%M %p'))
-commute_speeds['weekday'] = commute_speeds['date'].dt.day_name()
-
-period = []
-for day in commute_speeds['date']:
-    if day < datetime(2024, 12, 31):
-        period.append('Pre-CP')
-    else:
-        period.append('CP in Effect')
-
-commute_speeds['period'] = period
-
-agg_hr_df = (commute_speeds
-             .groupby(['link_name', 'date', 'hour', 'hour_label', 'weekday', 'period'])['mph']
-             .mean()
-             .reset_index())
-
-choice = agg_hr_df[(agg_hr_df.link_name == route_choice) & (agg_hr_df.weekday == day_choice)]
-
-choice = (choice
-          .groupby(['weekday', 'hour', 'hour_label', 'period', 'link_name'])['mph']
-          .mean()
-          .reset_index())
-
-choice = choice.sort_values(by='hour')
+# hourly averages for the selection come straight out of the precomputed cube
+choice = speed_cube.frame(route_choice, None if day_choice == 'All week' else day_choice)
 
 line_plot = px.line(choice, x = 'hour_label', y = 'mph', color = 'period', 
                     line_shape = 'spline',
@@ -153,4 +104,6 @@ line_plot.update_xaxes(
 
 ##### STREAMLIT APP #####
 
-st.plotly_chart(line_plot)
\ No newline at end of file
+st.plotly_chart(line_plot)
+
+show_import_profile()
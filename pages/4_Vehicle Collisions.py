@@ -1,80 +1,80 @@
 import os
 import sys
-import pandas as pd
-import pydeck as pdk
 import streamlit as st
-from PIL import Image
-from utils import plot_tlc_metric
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from utils import load_data
+from geofence import (CRZ_APPROACHES_PATH, CRZ_BOUNDARY_PATH, crz_zone_labels, load_approach_areas,
+                      load_crz_boundary, query_boxes)
+from hexbin import HEX_RADIUS_M, change_colors, difference_bins, fill_colors, load_hex_counts, month_bins
+from periods import MONTH_NAMES, MonthlySeries
+from utils import lazy_import, load_data, period_controls, plot_tlc_metric, show_import_profile, soda_params
+
+pdk = lazy_import('pydeck')
+
+# congestion zone polygon (Manhattan south of 60th Street, less the FDR Drive and West Side Highway)
+# plus the Queens and Brooklyn approach areas
+boundary_mtime = CRZ_BOUNDARY_PATH.stat().st_mtime
+approaches_mtime = CRZ_APPROACHES_PATH.stat().st_mtime
+crz_boundary = load_crz_boundary(CRZ_BOUNDARY_PATH, boundary_mtime)
+approach_areas = load_approach_areas(CRZ_APPROACHES_PATH, approaches_mtime)
 
 # --- Data Processing ---
 def preprocess_data(df):
     if df.empty:
         return df
 
-    # convert columns (otherwise most default to strings)
-    df['crash_date'] = pd.to_datetime(df['crash_date'], errors='coerce')
-    df['latitude'] = pd.to_numeric(df['latitude'], errors='coerce')
-    df['longitude'] = pd.to_numeric(df['longitude'], errors='coerce')
-    df['year'] = df['crash_date'].dt.year
-    df['month'] = df['crash_date'].dt.strftime('%B')
-
+    # columns arrive typed (see CRASH_SCHEMA), with unparseable values already missing
     df.dropna(subset=['crash_date', 'latitude', 'longitude'], inplace=True)
 
-    # Manhattan below 60th Street (easiest way to bound the congestion zone without working with SHP files)
-    manhattan_filter = (
-        (df['latitude'] >= 40.7000) & (df['latitude'] <= 40.7660) &
-        (df['longitude'] >= -74.0200) & (df['longitude'] <= -73.9500)
-    )
-
-    # Queens: Long Island City and east of Queensboro Bridge
-    queens_filter = (
-        (df['latitude'] >= 40.735) & (df['latitude'] <= 40.770) &
-        (df['longitude'] >= -73.9600) & (df['longitude'] <= -73.9300)
-    )
-
-    # Brooklyn: DUMBO, Brooklyn Heights, near Brooklyn Bridge
-    brooklyn_filter = (
-        (df['latitude'] >= 40.6900) & (df['latitude'] <= 40.7050) &
-        (df['longitude'] >= -73.9950) & (df['longitude'] <= -73.9700)
-    )
-
-    df_filtered = df[(manhattan_filter | queens_filter | brooklyn_filter)].copy()
+    # rows are already filtered to bounding boxes server-side; the polygon test drops the
+    # parts of the zone's box outside the zone (the rivers, New Jersey, the Upper East Side)
+    df['zone'] = crz_zone_labels(df['latitude'].to_numpy(), df['longitude'].to_numpy(),
+                                 CRZ_BOUNDARY_PATH, boundary_mtime, CRZ_APPROACHES_PATH, approaches_mtime)
+
+    df_filtered = df[df['zone'] != 'Outside'].copy()
     return df_filtered
 
 # data loading & processing 
 crashes_api_url = 'https://data.cityofnewyork.us/resource/h9gi-nx95.json'
-start_date_str = "2024-01-01T00:00:00" # from 01/01/2024
-end_date_str = pd.Timestamp.now().strftime("%Y-%m-%dT%H:%M:%S") # to now
-params = {
-    '$where': f"crash_date >= '{start_date_str}' AND crash_date < '{end_date_str}'",
-    '$limit': 200000
-}
-raw_crash_df = load_data(BASE_URL=crashes_api_url, params=params)
+start_date_str = "2024-01-01T00:00:00" # from 01/01/2024 to now
+# only the columns the page uses, and only crashes inside the bounding box of the zone or an approach area, cross the wire
+params = soda_params(
+    select=['crash_date', 'latitude', 'longitude'],
+    where=f"crash_date >= '{start_date_str}'",
+    boxes=query_boxes(crz_boundary, approach_areas)
+)
+# parsed straight into typed columns from the CSV endpoint
+CRASH_SCHEMA = {'crash_date': 'timestamp[ms]', 'latitude': 'float64', 'longitude': 'float64'}
+raw_crash_df = load_data(BASE_URL=crashes_api_url, params=params, schema=CRASH_SCHEMA)
 crz_crashes = preprocess_data(raw_crash_df)
 
+# monthly crash counts, indexed once per crash frame rather than on every rerun
+@st.cache_data
+def load_crash_series(crash_dates):
+    return MonthlySeries.from_dates(crash_dates)
+
+# the sidebar picks which months of which years to compare
+crash_series = load_crash_series(crz_crashes['crash_date'].to_numpy() if not crz_crashes.empty else [])
+years, months = period_controls(crash_series.years, crash_series.months())
+
 # Streamlit Subsection #1: Introduction & Motor Deaths section
 st.title("NYC Motor Vehicle Collisions (Congestion Zone & Surrounding Area)")
-st.write("Comparing crash densities across 2024 vs 2025. Use sidebar controls to select specific month.")
+st.write(f"Comparing crashes across {' vs '.join(map(str, years)) or 'no years'}. Use sidebar controls to select years and months.")
 st.markdown('''
 In 2024, 226 people were killed and 49,364 were injured as a result of motor vehicles collisions across NYC. 21 of those deaths occurred within the congestion zone and surrounding areas in Queens and Brooklyn. As a result, a large factor in the success of congestion pricing is whether the number of motor crashes saw a decrease or not. 
 ''')
-image = Image.open("./images/motor_deaths_in_2024.png")
-st.image(image, caption='Deaths via Motor Vehicle Collisions (2024)', use_container_width=True)
+st.image("./images/motor_deaths_in_2024.png", caption='Deaths via Motor Vehicle Collisions (2024)', use_container_width=True)
 
 # Streamlit Subsection #2: Monthly Crash Comparison viz
 st.markdown("---")
-st.subheader("Monthly Crash Comparison: 2024 vs 2025")
+st.subheader(f"Monthly Crash Comparison: {' vs '.join(map(str, years))}")
 st.markdown('''
 We begin with a comparison of the number of crashes across corresponding months in 2024 and 2025. This crash data is filtered down to crashes that occurred in the Congestion Relief zone and areas surrounding major infrastructure entering and exiting the zone from outer boroughs (e.g. Queensboro Bridge, Brooklyn Bridge, Williamsburg Bridge). 
 
 Based on this initial analysis, we can see that for each month that the congestion pricing was in effect (Jan - March 2025), there were less accidents in the same month of the previous year. However, we are seeing that gap slowly narrow with only a reduction of 3.04% from March 2024 to March 2025. 
 ''')
 
-grouped_df = crz_crashes.groupby(['year', 'month']).size().reset_index(name='crash_count')
-grouped_df = grouped_df.rename(columns={'year': 'Year', 'month': 'Month'})
+grouped_df = crash_series.compare(years, months, 'count').rename(columns={'count': 'crash_count'})
 
 fig_crash_counts = plot_tlc_metric(grouped_df, 'crash_count', 'Monthly Crash Count', 'count')
 st.altair_chart(fig_crash_counts, use_container_width=True)
@@ -83,18 +83,33 @@ st.altair_chart(fig_crash_counts, use_container_width=True)
 st.markdown("---")
 st.subheader("Crash Density Shift After Congestion Pricing")
 
-month_options = {"January": 1, "February": 2, "March": 3}
-month_choice = st.selectbox('Select month', options=["January", "February", "March"])
-
-df_2024 = crz_crashes[
-    (crz_crashes['crash_date'].dt.year == 2024) &
-    (crz_crashes['crash_date'].dt.month == month_options[month_choice])
-]
-
-df_2025 = crz_crashes[
-    (crz_crashes['crash_date'].dt.year == 2025) &
-    (crz_crashes['crash_date'].dt.month ==  month_options[month_choice])
-]
+# the maps compare the first and last selected years, so they need two of them
+if len(years) < 2:
+    st.info("Select at least two years in the sidebar to compare crash densities.")
+    show_import_profile()
+    st.stop()
+year_before, year_after = years[0], years[-1]
+
+month_choice = st.selectbox('Select month', options=[MONTH_NAMES[month - 1] for month in months or range(1, 13)])
+month_number = MONTH_NAMES.index(month_choice) + 1
+
+# crashes are binned server-side into ~200 m hexagons per month, so each map only receives the cells
+hex_counts = load_hex_counts(crz_crashes['latitude'].to_numpy(), crz_crashes['longitude'].to_numpy(),
+                             crz_crashes['crash_date'].dt.year.to_numpy(),
+                             crz_crashes['crash_date'].dt.month.to_numpy())
+bins_before = month_bins(hex_counts, year_before, month_number)
+bins_after = month_bins(hex_counts, year_after, month_number)
+bins_change = difference_bins(hex_counts, month_number, year_before, year_after)
+
+# both years share one color scale so their maps are comparable
+count_scale = max(bins_before['count'].to_numpy().max(initial=0), bins_after['count'].to_numpy().max(initial=0))
+bins_before['color'] = fill_colors(bins_before['count'], (0, 100, 255), count_scale) # blues
+bins_after['color'] = fill_colors(bins_after['count'], (255, 50, 50), count_scale) # reds
+bins_change['color'] = change_colors(bins_change['change'])
+
+# only the columns the layers and tooltips use are serialized into the map spec
+map_columns = ['latitude', 'longitude', 'count', 'color']
+change_columns = ['latitude', 'longitude', f'count_{year_before}', f'count_{year_after}', 'change', 'color']
 
 # configure map
 view_state = pdk.ViewState(
@@ -105,42 +120,55 @@ view_state = pdk.ViewState(
     bearing=0
 )
 
+# ColumnLayer with six sides draws each pre-aggregated cell as a flat hexagon
 common_layer_props = {
     "auto_highlight": True,
     "pickable": True,
-    "radius": 200,
-    "elevation_scale": 1,
-    "opacity": 0.3
+    "disk_resolution": 6,
+    "radius": HEX_RADIUS_M,
+    "coverage": 1,
+    "extruded": False,
+    "get_position": '[longitude, latitude]',
+    "get_fill_color": 'color',
 }
 
 before_layer = pdk.Layer(
-    "HexagonLayer",
-    data=df_2024,
-    id='2024_layer',
-    get_position='[longitude, latitude]',
-    get_fill_color=[0, 100, 255, 160], # blues
+    "ColumnLayer",
+    data=bins_before[map_columns],
+    id='before_layer',
     **common_layer_props
 )
 
 after_layer = pdk.Layer(
-    "HexagonLayer",
-    data=df_2025,
-    id='2025_layer',
-    get_position='[longitude, latitude]',
-    get_fill_color=[255, 50, 50, 160], # reds
+    "ColumnLayer",
+    data=bins_after[map_columns],
+    id='after_layer',
+    **common_layer_props
+)
+
+change_layer = pdk.Layer(
+    "ColumnLayer",
+    data=bins_change[change_columns],
+    id='change_layer',
     **common_layer_props
 )
 
 tooltip = {
-    "html": "<b>Number of Crashes:</b> {elevationValue}<br/>"
-            "<b>Location approx:</b> {position}",
+    "html": "<b>Number of Crashes:</b> {count}<br/>"
+            "<b>Location approx:</b> {latitude}, {longitude}",
+    "style": {"backgroundColor": "steelblue", "color": "white"}
+}
+
+change_tooltip = {
+    "html": f"<b>{year_before}:</b> {{count_{year_before}}}<br/><b>{year_after}:</b> {{count_{year_after}}}<br/>"
+            "<b>Change:</b> {change}",
     "style": {"backgroundColor": "steelblue", "color": "white"}
 }
 
 col1, col2 = st.columns(2)
 
 with col1:
-    st.subheader(f"{month_choice} 2024")
+    st.subheader(f"{month_choice} {year_before}")
     st.pydeck_chart(pdk.Deck(
         layers=[before_layer],
         initial_view_state=view_state,
@@ -150,7 +178,7 @@ with col1:
     ))
 
 with col2:
-    st.subheader(f"{month_choice} 2025")
+    st.subheader(f"{month_choice} {year_after}")
     st.pydeck_chart(pdk.Deck(
         layers=[after_layer],
         initial_view_state=view_state,
@@ -158,3 +186,15 @@ with col2:
         map_style=pdk.map_styles.MAPBOX_DARK,
         tooltip=tooltip
     ))
+
+st.subheader(f"Change in Crashes, {month_choice} {year_before} to {year_after}")
+st.caption(f"Red cells had more crashes in {year_after} than in {year_before}, blue cells fewer, gray cells the same number.")
+st.pydeck_chart(pdk.Deck(
+    layers=[change_layer],
+    initial_view_state=view_state,
+    map_provider='mapbox',
+    map_style=pdk.map_styles.MAPBOX_DARK,
+    tooltip=change_tooltip
+))
+
+show_import_profile()
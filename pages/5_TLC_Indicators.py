@@ -1,54 +1,30 @@
 import os
 import sys
-import pandas as pd
 import streamlit as st
-import altair as alt
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from utils import load_data, plot_tlc_metric
-
-# helper functions
-def preprocess_tlc_data(df, metrics):
-    # specifiy data types 
-    df['month_year'] = pd.to_datetime(df['month_year'])
-    for col in metrics:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-            
-    # filter data to Jan/Feb/March 2024 & 2025
-    df_filtered = df[df['month_year'].dt.month.isin([1, 2, 3]) & df['month_year'].dt.year.isin([2024, 2025])].copy()
-    df_filtered['Month'] = df_filtered['month_year'].dt.strftime('%B')
-    df_filtered['Year'] = df_filtered['month_year'].dt.year
-
-    return df_filtered
-
-# load data from NYC open data
-tlc_indicators_url = "https://data.cityofnewyork.us/resource/v6kb-cqej.json"
-params = {'$limit': 20000}
-metrics = [
-    'trips_per_day',
-    'farebox_per_day',
-    # 'unique_drivers',
-    # 'unique_vehicles',
-    # 'vehicles_per_day',
-    # 'avg_days_vehicles_on_road',
-    # 'avg_hours_per_day_per_vehicle',
-    # 'avg_days_drivers_on_road',
-    # 'avg_hours_per_day_per_driver',
-    'avg_minutes_per_trip',
-    # 'percent_of_trips_paid_with_credit_card',
-    # 'trips_per_day_shared'
-]
-
-tlc_df = load_data(tlc_indicators_url, params)
-filtered_df = preprocess_tlc_data(tlc_df, metrics)
+from periods import MonthlySeries
+from utils import TLC_METRICS, load_tlc_series, period_controls, plot_tlc_metric, show_import_profile
+
+# load data from NYC open data: every TLC metric is loaded and indexed by month once (cached), so
+# adding one of utils.TLC_METRICS to a chart, or comparing other years, does not add load work
+tlc_series = load_tlc_series()
+empty_series = MonthlySeries([], [], TLC_METRICS)
 
 # get specific licenese classes
-df_yellow = filtered_df[filtered_df['license_class'] == 'Yellow'].copy()
-df_fhv = filtered_df[filtered_df['license_class'] == 'FHV - High Volume'].copy()
+series_yellow = tlc_series.get('Yellow', empty_series)
+series_fhv = tlc_series.get('FHV - High Volume', empty_series)
+
+# any months of any years in the history can be compared; the default is Jan-Mar 2024 vs 2025
+years, months = period_controls(sorted(set(series_yellow.years) | set(series_fhv.years)),
+                                sorted(set(series_yellow.months()) | set(series_fhv.months())))
+# metrics charted below (any of utils.TLC_METRICS can be added)
+metrics = ['trips_per_day', 'farebox_per_day', 'avg_minutes_per_trip']
+df_yellow = {metric: series_yellow.compare(years, months, metric) for metric in metrics}
+df_fhv = {metric: series_fhv.compare(years, months, metric) for metric in metrics}
 
 
-st.title("TLC Industry Indicators (2024 vs 2025)")
+st.title(f"TLC Industry Indicators ({' vs '.join(map(str, years))})")
 st.write("Comparing select monthly metrics tabulated from trip records submitted for all TLC industries.")
 st.markdown(
     """
@@ -66,12 +42,12 @@ col1, col2 = st.columns(2)
 
 with col1:
     st.markdown("**Yellow**")
-    fig_trips_all = plot_tlc_metric(df_yellow, 'trips_per_day', "Trips per Day (Yellow)", "Trips")
+    fig_trips_all = plot_tlc_metric(df_yellow['trips_per_day'], 'trips_per_day', "Trips per Day (Yellow)", "Trips")
     st.altair_chart(fig_trips_all, use_container_width=True)
 
 with col2:
     st.markdown("**FHV - High Volume**")
-    fig_trips_fhv = plot_tlc_metric(df_fhv, 'trips_per_day', "Trips per Day (FHV)", "Trips")
+    fig_trips_fhv = plot_tlc_metric(df_fhv['trips_per_day'], 'trips_per_day', "Trips per Day (FHV)", "Trips")
     st.altair_chart(fig_trips_fhv, use_container_width=True)
 
 
@@ -87,12 +63,12 @@ col1, col2 = st.columns(2)
 
 with col1:
     st.markdown("**Yellow**")
-    fig_duration_all = plot_tlc_metric(df_yellow, 'avg_minutes_per_trip', "Avg Trip Duration (All TLC)", "Minutes")
+    fig_duration_all = plot_tlc_metric(df_yellow['avg_minutes_per_trip'], 'avg_minutes_per_trip', "Avg Trip Duration (All TLC)", "Minutes")
     st.altair_chart(fig_duration_all, use_container_width=True)
 
 with col2:
     st.markdown("**FHV - High Volume**")
-    fig_duration_fhv = plot_tlc_metric(df_fhv, 'avg_minutes_per_trip', "Avg Trip Duration (FHV)", "Minutes")
+    fig_duration_fhv = plot_tlc_metric(df_fhv['avg_minutes_per_trip'], 'avg_minutes_per_trip', "Avg Trip Duration (FHV)", "Minutes")
     st.altair_chart(fig_duration_fhv, use_container_width=True)
 
 st.markdown('''
@@ -110,7 +86,7 @@ st.markdown(
     """,
     unsafe_allow_html=True
 )
-fig_farebox = plot_tlc_metric(df_yellow, 'farebox_per_day', "Total Farebox Revenue per Day (Yellow)", "Farebox ($m)")
+fig_farebox = plot_tlc_metric(df_yellow['farebox_per_day'], 'farebox_per_day', "Total Farebox Revenue per Day (Yellow)", "Farebox ($m)")
 st.altair_chart(fig_farebox)
 
 
@@ -122,4 +98,6 @@ Farebox revenue for Yellow Taxis in 2025 was consistently higher than in 2024:
 This rise in farebox revenue, despite only modest increases in trip volume, suggests higher average fares per trip, likely due to new surcharges introduced under congestion pricing ($2.50 per trip). Regardless, the trend may point to an unintended but notable side effect of congestion pricing: a slow revitalization of the yellow cab industry, as more riders may be opting for taxis over personal vehicles to navigate the city.
 
 However, it's difficult to isolate the effects of congestion pricing alone. The TLC has introduced other policy and operational changes in recent years that could also be contributing to increased ridership and revenue.
-''')
\ No newline at end of file
+''')
+
+show_import_profile()
@@ -1,19 +1,22 @@
 # MTA Congestion Pricing Impact Analysis
-# Python code to reproduce ITS, DiD, and Counterfactual projections, including saving PNGs
+# Python code to reproduce ITS, DiD, and Counterfactual projections, rendered to cached PNGs
 
+import os
+import sys
 import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import statsmodels.api as sm
 import streamlit as st
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ridership import (MODE_COLORS, RIDERSHIP_PATH, load_did_estimates, load_its_estimates, load_ridership_pivot,
+                       load_rolling_pivot, render_counterfactual_chart, render_did_chart, render_its_chart,
+                       seasonal_counterfactual)
+from utils import show_import_profile
+
 st.title('MTA Ridership')
 
 # Step 1: Load and Preprocess Data
-file_path = "data/MTA_Daily_Ridership_and_Traffic__Beginning_2020_20250416.csv"
-df = pd.read_csv(file_path)
-df['Date'] = pd.to_datetime(df['Date'])
-pivot_df = df.pivot(index='Date', columns='Mode', values='Count')
+ridership_mtime = RIDERSHIP_PATH.stat().st_mtime
+pivot_df = load_ridership_pivot(RIDERSHIP_PATH, ridership_mtime)
 filtered_df = pivot_df[pivot_df.index >= '2024-01-01']
 
 # Define dates
@@ -23,19 +26,16 @@ highlight_end = pd.to_datetime("2025-04-30")
 highlight_2024_start = pd.to_datetime("2024-01-01")
 highlight_2024_end = pd.to_datetime("2024-04-30")
 
-# Step 2: ITS Analysis Preparation
-its_df = filtered_df[['LIRR', 'MNR']].copy()
-its_df['LIRR_7d'] = its_df['LIRR'].rolling(window=7).mean()
-its_df['MNR_7d'] = its_df['MNR'].rolling(window=7).mean()
+# Step 2: ITS Analysis Preparation (7-day averages of every mode, one pass). The pivot is cut at
+# 2024-01-01 before rolling, so the first six days of 2024 have no average rather than one that
+# reaches back into December 2023.
+rolling_df = load_rolling_pivot(RIDERSHIP_PATH, ridership_mtime, 7, '2024-01-01')
+its_df = rolling_df[['LIRR', 'MNR']]
 
 # Step 3: ITS Calculation
-avg_lirr_2024 = its_df.loc[highlight_2024_start:highlight_2024_end, 'LIRR_7d'].mean()
-avg_lirr_2025 = its_df.loc[highlight_start:highlight_end, 'LIRR_7d'].mean()
-lirr_pct_change = ((avg_lirr_2025 - avg_lirr_2024) / avg_lirr_2024) * 100
-
-avg_mnr_2024 = its_df.loc[highlight_2024_start:highlight_2024_end, 'MNR_7d'].mean()
-avg_mnr_2025 = its_df.loc[highlight_start:highlight_end, 'MNR_7d'].mean()
-mnr_pct_change = ((avg_mnr_2025 - avg_mnr_2024) / avg_mnr_2024) * 100
+avg_2024_7d = its_df.loc[highlight_2024_start:highlight_2024_end].mean()
+avg_2025_7d = its_df.loc[highlight_start:highlight_end].mean()
+its_pct_change = (avg_2025_7d - avg_2024_7d) / avg_2024_7d * 100
 
 # Step 4: DiD Calculation
 comparison_modes = ['LIRR', 'MNR', 'SIR']
@@ -50,56 +50,22 @@ did_lirr = change_2024_2025['LIRR'] - change_2024_2025['SIR']
 did_mnr = change_2024_2025['MNR'] - change_2024_2025['SIR']
 combined_treatment_effect = (did_lirr + did_mnr) / 2
 
-# Step 5: Seasonally Adjusted Counterfactual
-jan_apr_2024_lirr = filtered_df.loc["2024-01-01":"2024-04-30", 'LIRR'].reset_index(drop=True)
-jan_apr_2024_mnr = filtered_df.loc["2024-01-01":"2024-04-30", 'MNR'].reset_index(drop=True)
-
-dec_2024_lirr_base = filtered_df.loc["2024-12-24":"2024-12-31", 'LIRR'].mean()
-dec_2024_mnr_base = filtered_df.loc["2024-12-24":"2024-12-31", 'MNR'].mean()
-
-jan_2024_lirr_base = jan_apr_2024_lirr.mean()
-jan_2024_mnr_base = jan_apr_2024_mnr.mean()
-
-lirr_scale = dec_2024_lirr_base / jan_2024_lirr_base
-mnr_scale = dec_2024_mnr_base / jan_2024_mnr_base
-
-lirr_counterfactual_2025 = jan_apr_2024_lirr * lirr_scale
-mnr_counterfactual_2025 = jan_apr_2024_mnr * mnr_scale
-
-actual_2025_lirr = filtered_df.loc["2025-01-01":"2025-04-30", 'LIRR'].reset_index(drop=True)
-actual_2025_mnr = filtered_df.loc["2025-01-01":"2025-04-30", 'MNR'].reset_index(drop=True)
-date_range = filtered_df.loc["2025-01-01":"2025-04-30"].index
-
-# Ensure same length
-min_length = min(len(date_range), len(lirr_counterfactual_2025))
-date_range = date_range[:min_length]
-actual_2025_lirr = actual_2025_lirr[:min_length]
-actual_2025_mnr = actual_2025_mnr[:min_length]
-lirr_counterfactual_2025 = lirr_counterfactual_2025[:min_length]
-mnr_counterfactual_2025 = mnr_counterfactual_2025[:min_length]
-
-# Step 6: Plotting and Saving Figures
-# ITS Visualization
-fig_its, ax_its = plt.subplots(2, 1, figsize=(12, 8), sharex=True)
-ax_its[0].plot(its_df.index, its_df['LIRR_7d'], label='LIRR (7-day Avg)', color='blue')
-ax_its[0].axvline(intervention_date, color='red', linestyle='--', label='Policy Start')
-ax_its[0].axvspan(highlight_2024_start, highlight_2024_end, color='blue', alpha=0.1)
-ax_its[0].axvspan(highlight_start, highlight_end, color='orange', alpha=0.2)
-ax_its[0].set_title('LIRR Ridership (7-day Avg) with Jan–Apr Highlights')
-ax_its[0].legend()
-ax_its[0].grid(True)
-
-ax_its[1].plot(its_df.index, its_df['MNR_7d'], label='MNR (7-day Avg)', color='green')
-ax_its[1].axvline(intervention_date, color='red', linestyle='--', label='Policy Start')
-ax_its[1].axvspan(highlight_2024_start, highlight_2024_end, color='blue', alpha=0.1)
-ax_its[1].axvspan(highlight_start, highlight_end, color='orange', alpha=0.2)
-ax_its[1].set_title('MNR Ridership (7-day Avg) with Jan–Apr Highlights')
-ax_its[1].legend()
-ax_its[1].grid(True)
-
-plt.xlabel('Date')
-plt.tight_layout()
-# plt.savefig("ITS_LIRR_MNR.png")
+# Regression estimates with block-bootstrap 95% confidence intervals (cached per data version)
+its_estimates = load_its_estimates(RIDERSHIP_PATH, ridership_mtime, ('LIRR', 'MNR'), '2024-01-01', '2025-01-05')
+did_periods = (('2024-01-01', '2024-04-30'), ('2025-01-05', '2025-04-30'))
+did_sir = load_did_estimates(RIDERSHIP_PATH, ridership_mtime, ('LIRR', 'MNR'), ('SIR',), *did_periods)
+did_panel = load_did_estimates(RIDERSHIP_PATH, ridership_mtime, ('LIRR', 'MNR'),
+                               ('SIR', 'Subway', 'Bus', 'BT', 'AAR'), *did_periods, log=True)
+
+# Step 5: Seasonally Adjusted Counterfactual (all modes at once; the chart shows the selected ones)
+cf_baseline = ('2024-01-01', '2024-04-30')
+cf_anchor = ('2024-12-24', '2024-12-31')
+cf_projection = ('2025-01-01', '2025-04-30')
+
+# Step 6: Plotting
+# ITS Visualization (rendered once per input data, then served as cached PNG bytes)
+its_png = render_its_chart(its_df, ['LIRR', 'MNR'], ['blue', 'green'], intervention_date,
+                           [(highlight_2024_start, highlight_2024_end), (highlight_start, highlight_end)])
 
 # STREAMLIT APP
 
@@ -108,30 +74,25 @@ Taking into consideration that many modes included in the MTA data are not direc
 by congestion pricing, two main modes for longer distance travel into Manhattan are examined 
 for daily ridership trends, the Long Island Railroad (LIRR) and Metro-North Railroad (MNR).
 ''')
-st.pyplot(fig_its)
+st.image(its_png, use_container_width=True)
 st.markdown('''
 In both cases, a notable increase in ridership was observed during the January–April 2025 period 
 compared to the same months in 2024, controlling for seasonal variation. Specifically, LIRR 
 ridership rose by approximately 9.7\% relative to January–April 2024. MNR ridership rose by 
 approximately 6.1\% relative to January–April 2024.
+
+A segmented regression puts error bars on the break at the policy start. Each mode's daily ridership 
+since January 2024 is fit with a linear trend, day-of-week effects and annual seasonal terms, plus a 
+level and slope change from January 5, 2025. The intervals come from resampling two-week blocks of 
+residuals 2,000 times.
 ''')
+st.dataframe(its_estimates.style.format('{:,.1f}'))
 
 # DiD Bar Chart
-fig_did, ax = plt.subplots(figsize=(8, 6))
-x = np.arange(len(comparison_modes))
-bar_width = 0.35
-ax.bar(x - bar_width/2, avg_2024_all, bar_width, label='2024')
-ax.bar(x + bar_width/2, avg_2025_all, bar_width, label='2025')
-ax.set_xticks(x)
-ax.set_xticklabels(comparison_modes)
-ax.set_ylabel('Average Daily Riders (Jan–Apr)')
-ax.set_title('Difference-in-Differences: LIRR & MNR vs SIR')
-ax.legend()
-plt.grid(axis='y', linestyle='--', alpha=0.6)
-plt.tight_layout()
-# plt.savefig("DiD_LIRR_MNR_SIR.png")
-
-st.pyplot(fig_did)
+did_png = render_did_chart(avg_2024_all, avg_2025_all, comparison_modes, ['2024', '2025'],
+                           'Difference-in-Differences: LIRR & MNR vs SIR')
+
+st.image(did_png, use_container_width=True)
 st.markdown('''
 To strengthen causal inference, a Difference-in-Differences (DiD) framework was applied, using 
 Staten Island Railway (SIR) as a control group. Average daily ridership for each mode was calculated 
@@ -144,28 +105,49 @@ isolating the net effect of congestion pricing from broader system-wide trends.
 Results showed LIRR ridership increased by 18,134 average daily riders, while MNR increased by 10,047 
 between January–April 2024 and the same period in 2025. SIR ridership, by contrast, increased by only 170 
 average daily riders over the same period.
+
+The same comparison as a two-way fixed effects regression (mode and date effects) gives the 
+estimates below with bootstrap 95% intervals. The first table uses SIR as the only control, in 
+riders per day. The second uses every mode with a full daily series as controls (SIR, subway, bus, 
+bridges and tunnels, and Access-A-Ride) and is estimated on log ridership, so effects are percent 
+changes. Subway and bus ridership may itself respond to the toll, which would bias that comparison 
+toward zero.
 ''')
+col1, col2 = st.columns(2)
+col1.markdown('**Control: SIR (riders/day)**')
+col1.dataframe(did_sir.style.format('{:,.1f}'))
+col2.markdown('**Controls: all other modes (%)**')
+col2.dataframe(did_panel.style.format('{:,.2f}'))
 
 
 # Counterfactual Projection Plot
-fig_cf, ax_cf = plt.subplots(2, 1, figsize=(12, 8), sharex=True)
-ax_cf[0].plot(date_range, actual_2025_lirr, label='LIRR Actual', color='blue')
-ax_cf[0].plot(date_range, lirr_counterfactual_2025, label='Seasonal Counterfactual', linestyle='--', color='gray')
-ax_cf[0].set_title('LIRR: Actual vs Seasonal Counterfactual')
-ax_cf[0].legend()
-ax_cf[0].grid(True)
-
-ax_cf[1].plot(date_range, actual_2025_mnr, label='MNR Actual', color='green')
-ax_cf[1].plot(date_range, mnr_counterfactual_2025, label='Seasonal Counterfactual', linestyle='--', color='gray')
-ax_cf[1].set_title('MNR: Actual vs Seasonal Counterfactual')
-ax_cf[1].legend()
-ax_cf[1].grid(True)
-
-plt.xlabel('Date')
-plt.tight_layout()
-# plt.savefig("Counterfactual_LIRR_MNR.png")
-
-st.pyplot(fig_cf)
+with st.expander('Counterfactual windows'):
+    def date_window(label, default):
+        first_day, last_day = pivot_df.index.min(), pivot_df.index.max()
+        picked = st.date_input(label, [min(max(pd.Timestamp(day), first_day), last_day).date() for day in default],
+                               min_value=first_day.date(), max_value=last_day.date())
+        # fall back to the default while only one end of the range has been picked
+        return tuple(str(day) for day in picked) if len(picked) == 2 else default
+
+    cf_baseline = date_window('Seasonal baseline', cf_baseline)
+    cf_anchor = date_window('Scaling anchor (just before the policy)', cf_anchor)
+    cf_projection = date_window('Projection', cf_projection)
+
+actual_cf, counterfactual_cf = seasonal_counterfactual(RIDERSHIP_PATH, ridership_mtime, cf_baseline, cf_anchor,
+                                                       cf_projection)
+# modes without data in every window (e.g. CRZ entries before 2025) have no counterfactual
+cf_modes = counterfactual_cf.columns[counterfactual_cf.notna().any()].tolist()
+selected_modes = st.multiselect('Modes', cf_modes, default=[mode for mode in ['LIRR', 'MNR'] if mode in cf_modes])
+
+if selected_modes:
+    cf_png = render_counterfactual_chart(actual_cf, counterfactual_cf, selected_modes,
+                                         [MODE_COLORS.get(mode, 'black') for mode in selected_modes])
+    st.image(cf_png, use_container_width=True)
+
+    cf_summary = pd.DataFrame({'Actual': actual_cf[selected_modes].mean(),
+                               'Counterfactual': counterfactual_cf[selected_modes].mean()})
+    cf_summary['Difference (%)'] = (cf_summary['Actual'] / cf_summary['Counterfactual'] - 1) * 100
+    st.dataframe(cf_summary.style.format('{:,.1f}'))
 st.markdown('''
 The seasonally adjusted counterfactual analysis was conducted to control for natural seasonal 
 fluctuations in ridership unrelated to congestion pricing. The January–April 2024 ridership patterns 
@@ -177,3 +159,5 @@ intervention. This adjusted seasonal profile was then projected forward for Janu
 the expected ridership trajectory absent the policy. Actual 2025 ridership was compared against this 
 counterfactual, with deviations interpreted as evidence of the policy’s causal impact.
 ''')
+
+show_import_profile()
@@ -0,0 +1,63 @@
+import calendar
+
+import numpy as np
+import pandas as pd
+
+# Year-over-year comparisons on monthly series. Months are held as sorted ordinals
+# (year * 12 + month - 1) next to a (months, columns) value array, so any "these months in
+# these years" query is one searchsorted over the ordinals instead of a pass over the data.
+
+MONTH_NAMES = list(calendar.month_name)[1:]
+
+
+def month_ordinals(dates):
+    dates = pd.DatetimeIndex(dates)
+    return dates.year.to_numpy(dtype='int64') * 12 + dates.month.to_numpy(dtype='int64') - 1
+
+
+class MonthlySeries:
+    def __init__(self, ordinals, values, columns):
+        ordinals = np.asarray(ordinals, dtype='int64')
+        order = np.argsort(ordinals, kind='stable')
+        self.ordinals = ordinals[order]
+        self.columns = list(columns)
+        self.values = np.asarray(values, dtype='float64').reshape(len(ordinals), len(self.columns))[order]
+
+    # frame indexed by month (any timestamp within the month), one column per metric
+    @classmethod
+    def from_frame(cls, frame):
+        return cls(month_ordinals(frame.index), frame.to_numpy(dtype='float64'), frame.columns)
+
+    # number of events per month
+    @classmethod
+    def from_dates(cls, dates, name='count'):
+        ordinals, counts = np.unique(month_ordinals(pd.DatetimeIndex(dates).dropna()), return_counts=True)
+        return cls(ordinals, counts, [name])
+
+    @property
+    def years(self):
+        return np.unique(self.ordinals // 12).tolist()
+
+    # calendar months (1-12) with data in any of the given years
+    def months(self, years=None):
+        ordinals = self.ordinals if years is None else self.ordinals[np.isin(self.ordinals // 12, years)]
+        return np.unique(ordinals % 12 + 1).tolist()
+
+    # (len(years), len(months)) values of one column, NaN where a month has no data
+    def lookup(self, years, months, column):
+        wanted = np.add.outer(np.asarray(years, dtype='int64') * 12, np.asarray(months, dtype='int64') - 1)
+        if not len(self.ordinals):
+            return np.full(wanted.shape, np.nan)
+        pos = np.searchsorted(self.ordinals, wanted).clip(max=len(self.ordinals) - 1)
+        values = self.values[pos, self.columns.index(column)]
+        return np.where(self.ordinals[pos] == wanted, values, np.nan)
+
+    # long frame with Year, Month (name) and the column, for the comparison charts; months
+    # without data are left out
+    def compare(self, years, months, column):
+        table = self.lookup(years, months, column)
+        year_grid, month_grid = np.meshgrid(np.asarray(years), np.asarray(months, dtype='int64'), indexing='ij')
+        found = ~np.isnan(table)
+        return pd.DataFrame({'Year': year_grid[found],
+                             'Month': np.array(MONTH_NAMES)[month_grid[found] - 1],
+                             column: table[found]})
@@ -0,0 +1,270 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from soda_cache import atomic_write_parquet
+
+BASE_DIR = Path(__file__).parent
+DATA_DIR = BASE_DIR / 'data'
+ENTRIES_PATH = DATA_DIR / 'vehicle_entries_grouped.csv'
+ENTRIES_STORE_DIR = DATA_DIR / 'cache' / 'crz_entries'
+
+# MTA Congestion Relief Zone Vehicle Entries, 10-minute blocks per detection group
+RAW_ENTRIES_URL = 'https://data.ny.gov/api/views/t6yz-b64h/rows.csv?accessType=DOWNLOAD'
+# grain of vehicle_entries_grouped.csv, which the raw export is aggregated to
+ENTRY_GRAIN = ['Toll Date', 'Day of Week', 'Toll Week', 'Time Period', 'Vehicle Class']
+# raw export vehicle classes -> the grouped classes used on the revenue page
+RAW_VEHICLE_CLASSES = {
+    '1 - Cars, Pickups and Vans': 'Passenger Cars & Vans',
+    '2 - Single-Unit Trucks': 'Single-Unit Trucks',
+    '3 - Multi-Unit Trucks': 'Multi-Unit Trucks',
+    '4 - Buses': 'Buses',
+    '5 - Motorcycles': 'Motorcycles',
+    'TLC Taxi/FHV': 'TLC Taxi/FHV',
+}
+
+# display order used by the revenue charts
+VEHICLE_CLASSES = ['Passenger Cars & Vans', 'TLC Taxi/FHV', 'Single-Unit Trucks', 'Buses',
+                   'Multi-Unit Trucks', 'Motorcycles']
+TIME_PERIODS = ['Peak', 'Overnight']
+GROUP_COLUMNS = {'Vehicle Class': VEHICLE_CLASSES, 'Time Period': TIME_PERIODS}
+
+toll_data = [
+    ['Passenger Cars & Vans', '$9.00', '$2.25', ''],
+    ['Single-Unit Trucks', '$14.40', '$3.60', ''],
+    ['Multi-Unit Trucks', '$21.60', '$5.40', ''],
+    ['Sightseeing Buses', '$21.60', '$5.40', ''],
+    ['Other Buses', '$14.40', '$3.60', ''],
+    ['Motorcycles', '$4.50', '$1.05'],
+    ['TLC Taxi', '', '', '$0.75'],
+    ['App-based FHV', '', '', '$1.50']
+]
+
+# assumptions behind the revenue estimates, as listed on the revenue page
+DEFAULT_ASSUMPTIONS = {
+    'sightseeing_bus_share': 0.05, # share of buses charged the sightseeing rate
+    'fhv_share': 0.75,             # share of TLC entries that are app-based FHV rather than taxis
+    'rides_per_vehicle': 10,       # TLC trips per vehicle entering the zone
+    'credit_reduction': 0.15,      # tunnel credits and low-income discounts
+    'mta_share': 0.80,             # share of revenue attributed to MTA projects (Article 44-C)
+}
+
+
+# grouped entries from the hand-exported CSV, or from the ingested store when given its directory
+def read_entries(path=ENTRIES_PATH):
+    if Path(path).is_dir():
+        return pd.concat([pd.read_parquet(part) for part in sorted(Path(path).glob('*.parquet'))],
+                         ignore_index=True)
+    entries = pd.read_csv(path, dtype={'Vehicle Class': 'category', 'Time Period': 'category'})
+    entries['Toll Date'] = pd.to_datetime(entries['Toll Date'], format='%m/%d/%Y')
+    return entries
+
+
+# Daily revenue per vehicle class and per time period, held as (days, groups) arrays with
+# prefix sums along the day axis, so the total over any date range is one subtraction per group
+class RevenueRollup:
+    def __init__(self, start, daily):
+        self.start = np.datetime64(start, 'D')
+        self.daily = daily
+        self.groups = {by: list(frame.columns) for by, frame in daily.items()}
+        self.prefix = {by: np.vstack([np.zeros((1, frame.shape[1])), np.cumsum(frame.to_numpy(), axis=0)])
+                       for by, frame in daily.items()}
+        self.n_days = next(iter(self.prefix.values())).shape[0] - 1
+        self.end = self.start + np.timedelta64(self.n_days - 1, 'D')
+
+    @classmethod
+    def from_entries(cls, entries, value_col='Estimated Revenue'):
+        day = entries['Toll Date'].to_numpy().astype('datetime64[D]')
+        start = day.min()
+        offset = (day - start).astype(np.int64)
+        n_days = int(offset.max()) + 1
+
+        daily = {}
+        for by, order in GROUP_COLUMNS.items():
+            # known groups in display order, then anything new in the data
+            groups = order + sorted(set(entries[by].astype(str)) - set(order))
+            codes = pd.Categorical(entries[by].astype(str), categories=groups).codes
+            cells = offset * len(groups) + codes
+            totals = np.bincount(cells, weights=entries[value_col].to_numpy(), minlength=n_days * len(groups))
+            daily[by] = pd.DataFrame(totals.reshape(n_days, len(groups)), columns=groups,
+                                     index=pd.date_range(pd.Timestamp(start), periods=n_days, freq='D'))
+        return cls(start, daily)
+
+    def _bounds(self, start=None, end=None):
+        # inclusive date range -> row bounds into the prefix arrays, clipped to the data
+        first = 0 if start is None else (np.datetime64(start, 'D') - self.start).astype(np.int64)
+        last = self.n_days - 1 if end is None else (np.datetime64(end, 'D') - self.start).astype(np.int64)
+        first = int(np.clip(first, 0, self.n_days))
+        return first, int(np.clip(last + 1, first, self.n_days))
+
+    # revenue per group over [start, end]
+    def totals(self, by='Vehicle Class', start=None, end=None):
+        first, stop = self._bounds(start, end)
+        prefix = self.prefix[by]
+        return pd.Series(prefix[stop] - prefix[first], index=self.groups[by], name='Estimated Revenue')
+
+    def total(self, start=None, end=None):
+        return float(self.totals('Vehicle Class', start, end).sum())
+
+    # long-form daily revenue for charting, one row per day and group with revenue
+    def daily_frame(self, by='Vehicle Class', start=None, end=None):
+        first, stop = self._bounds(start, end)
+        frame = (self.daily[by].iloc[first:stop]
+                 .rename_axis('Toll Date')
+                 .reset_index()
+                 .melt(id_vars='Toll Date', var_name=by, value_name='Estimated Revenue'))
+        return frame[frame['Estimated Revenue'] != 0].reset_index(drop=True)
+
+
+@st.cache_data
+def load_entries(path=ENTRIES_PATH, mtime=None):
+    return read_entries(path)
+
+
+@st.cache_data
+def load_revenue_rollup(path=ENTRIES_PATH, mtime=None):
+    return RevenueRollup.from_entries(read_entries(path))
+
+
+# Revenue model: estimates from raw entry counts and the toll rate table
+
+def toll_rate_table():
+    return pd.DataFrame(toll_data, columns=['Vehicle Class', 'Peak', 'Overnight', 'Per Trip']).set_index('Vehicle Class')
+
+
+def parse_toll_rates(toll_rates):
+    return toll_rates.apply(lambda col: pd.to_numeric(col.str.replace('$', '', regex=False), errors='coerce'))
+
+
+# Effective rate per vehicle class and period, shape (..., classes, periods). Assumptions may be
+# scalars or arrays of the same shape, in which case one rate table is built per scenario.
+def class_rates(toll_rates, sightseeing_bus_share, fhv_share, rides_per_vehicle):
+    rates = parse_toll_rates(toll_rates)
+    peak_overnight = rates[TIME_PERIODS]
+    bus_share = np.asarray(sightseeing_bus_share, dtype=float)[..., None]
+    fhv = np.asarray(fhv_share, dtype=float)
+    rides = np.asarray(rides_per_vehicle, dtype=float)
+
+    buses = (bus_share * peak_overnight.loc['Sightseeing Buses'].to_numpy()
+             + (1 - bus_share) * peak_overnight.loc['Other Buses'].to_numpy())
+    # TLC vehicles pay per trip at every hour; the blended per-trip rate is rounded to cents
+    per_trip = np.round((1 - fhv) * rates.loc['TLC Taxi', 'Per Trip'] + fhv * rates.loc['App-based FHV', 'Per Trip'], 2)
+    tlc = np.repeat((per_trip * rides)[..., None], len(TIME_PERIODS), axis=-1)
+
+    by_class = {
+        'Passenger Cars & Vans': peak_overnight.loc['Passenger Cars & Vans'].to_numpy(),
+        'TLC Taxi/FHV': tlc,
+        'Single-Unit Trucks': peak_overnight.loc['Single-Unit Trucks'].to_numpy(),
+        'Buses': buses,
+        'Multi-Unit Trucks': peak_overnight.loc['Multi-Unit Trucks'].to_numpy(),
+        'Motorcycles': peak_overnight.loc['Motorcycles'].to_numpy(),
+    }
+    shape = np.broadcast_shapes(bus_share.shape[:-1], fhv.shape, rides.shape) + (len(TIME_PERIODS),)
+    return np.stack([np.broadcast_to(by_class[cls], shape) for cls in VEHICLE_CLASSES], axis=-2)
+
+
+# entry counts summed into a (classes, periods) matrix
+def entry_matrix(entries, count_col='CRZ Entries'):
+    class_codes = pd.Categorical(entries['Vehicle Class'].astype(str), categories=VEHICLE_CLASSES).codes
+    period_codes = pd.Categorical(entries['Time Period'].astype(str), categories=TIME_PERIODS).codes
+    known = (class_codes >= 0) & (period_codes >= 0)
+    cells = class_codes[known] * len(TIME_PERIODS) + period_codes[known]
+    counts = np.bincount(cells, weights=entries[count_col].to_numpy()[known],
+                         minlength=len(VEHICLE_CLASSES) * len(TIME_PERIODS))
+    return counts.reshape(len(VEHICLE_CLASSES), len(TIME_PERIODS))
+
+
+# Estimated rate and revenue for every row of entries under one set of assumptions
+def estimate_revenue(entries, toll_rates, count_col='CRZ Entries', **assumptions):
+    params = {**DEFAULT_ASSUMPTIONS, **assumptions}
+    rates = class_rates(toll_rates, params['sightseeing_bus_share'], params['fhv_share'],
+                        params['rides_per_vehicle'])
+    class_codes = pd.Categorical(entries['Vehicle Class'].astype(str), categories=VEHICLE_CLASSES).codes
+    period_codes = pd.Categorical(entries['Time Period'].astype(str), categories=TIME_PERIODS).codes
+    known = (class_codes >= 0) & (period_codes >= 0)
+
+    rate = np.where(known, rates[class_codes, period_codes], np.nan)
+    revenue = entries[count_col].to_numpy() * rate * (1 - params['credit_reduction']) * params['mta_share']
+    return pd.DataFrame({'Estimated Rate': rate, 'Estimated Revenue': revenue}, index=entries.index)
+
+
+# Total revenue for every combination of the given assumption values, evaluated as one batched
+# array operation. Assumptions not passed keep their default value.
+def scenario_sweep(entries, toll_rates, count_col='CRZ Entries', **grids):
+    names = list(DEFAULT_ASSUMPTIONS)
+    axes = [np.atleast_1d(np.asarray(grids.get(name, DEFAULT_ASSUMPTIONS[name]), dtype=float)) for name in names]
+    mesh = [axis.ravel() for axis in np.meshgrid(*axes, indexing='ij')]
+    params = dict(zip(names, mesh))
+
+    rates = class_rates(toll_rates, params['sightseeing_bus_share'], params['fhv_share'],
+                        params['rides_per_vehicle'])
+    gross = np.einsum('cp,scp->s', entry_matrix(entries, count_col), rates)
+    totals = gross * (1 - params['credit_reduction']) * params['mta_share']
+    return pd.DataFrame({**params, 'Estimated Revenue': totals})
+
+
+# Revenue at DEFAULT_ASSUMPTIONS, the baseline scenarios are compared against; once per entries version
+@st.cache_data
+def load_baseline_total(path=ENTRIES_PATH, mtime=None):
+    return scenario_sweep(load_entries(path, mtime), toll_rate_table())['Estimated Revenue'].iloc[0]
+
+
+# Entries store: the raw export aggregated to the grouped grain, one parquet file per month
+
+def entries_watermark(store_dir=ENTRIES_STORE_DIR):
+    partitions = sorted(store_dir.glob('*.parquet'))
+    if not partitions:
+        return None
+    return pd.read_parquet(partitions[-1], columns=['Toll Date'])['Toll Date'].max()
+
+
+# Read the raw export in fixed-size batches and fold each batch into running totals at the
+# grouped grain, so memory depends on the number of days, not the number of raw rows.
+# Days before the store's newest day are skipped; that day is re-aggregated in full.
+def ingest_entries(source=RAW_ENTRIES_URL, store_dir=ENTRIES_STORE_DIR, chunksize=500_000):
+    store_dir.mkdir(parents=True, exist_ok=True)
+    watermark = entries_watermark(store_dir)
+
+    totals = None
+    reader = pd.read_csv(source, usecols=ENTRY_GRAIN + ['CRZ Entries'], chunksize=chunksize,
+                         dtype={'Day of Week': 'category', 'Time Period': 'category', 'Vehicle Class': 'category',
+                                'Toll Week': 'category', 'Toll Date': 'category'})
+    for chunk in reader:
+        if watermark is not None:
+            chunk = chunk[pd.to_datetime(chunk['Toll Date'].astype(str), format='%m/%d/%Y') >= watermark]
+        part = chunk.groupby(ENTRY_GRAIN, observed=True)['CRZ Entries'].sum()
+        totals = part if totals is None else totals.add(part, fill_value=0)
+
+    if totals is None or totals.empty:
+        return []
+
+    entries = totals.reset_index()
+    entries['Toll Date'] = pd.to_datetime(entries['Toll Date'].astype(str), format='%m/%d/%Y')
+    entries['Toll Week'] = entries['Toll Week'].astype(str)
+    entries['Day of Week'] = entries['Day of Week'].astype(str)
+    entries['Time Period'] = entries['Time Period'].astype(str)
+    raw_class = entries['Vehicle Class'].astype(str)
+    entries['Vehicle Class'] = raw_class.map(RAW_VEHICLE_CLASSES).fillna(raw_class)
+    # the raw classes map many-to-one in principle, so regroup after renaming
+    entries = entries.groupby(ENTRY_GRAIN, as_index=False)['CRZ Entries'].sum()
+    entries['CRZ Entries'] = entries['CRZ Entries'].astype('int64')
+    entries = entries.join(estimate_revenue(entries, toll_rate_table()))
+
+    written = []
+    for month, month_df in entries.groupby(entries['Toll Date'].dt.to_period('M')):
+        path = store_dir / f'{month.year}-{month.month:02d}.parquet'
+        if path.exists():
+            existing = pd.read_parquet(path)
+            month_df = pd.concat([existing[existing['Toll Date'] < month_df['Toll Date'].min()], month_df],
+                                 ignore_index=True)
+        atomic_write_parquet(month_df, path)
+        written.append(month)
+    return written
+
+
+if __name__ == '__main__':
+    months = ingest_entries(sys.argv[1] if len(sys.argv) > 1 else RAW_ENTRIES_URL)
+    print(f'Wrote {len(months)} month partition(s) to {ENTRIES_STORE_DIR}')
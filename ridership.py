@@ -0,0 +1,169 @@
+import io
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from causal import did_estimates, its_estimates
+from soda_cache import atomic_write_parquet
+
+BASE_DIR = Path(__file__).parent
+DATA_DIR = BASE_DIR / 'data'
+RIDERSHIP_PATH = DATA_DIR / 'MTA_Daily_Ridership_and_Traffic__Beginning_2020_20250416.csv'
+RIDERSHIP_CACHE_DIR = DATA_DIR / 'cache' / 'ridership'
+
+
+# Long-form ridership with Mode as a categorical and Count as a 32-bit integer (nullable, since
+# some days have no count). The CSV is converted once to parquet, which later loads read instead.
+def read_ridership(path=RIDERSHIP_PATH, cache_dir=RIDERSHIP_CACHE_DIR):
+    parquet_path = cache_dir / f'{path.stem}.parquet'
+    if parquet_path.exists() and parquet_path.stat().st_mtime >= path.stat().st_mtime:
+        return pd.read_parquet(parquet_path)
+
+    df = pd.read_csv(path, dtype={'Mode': 'category', 'Count': 'Int32'})
+    df['Date'] = pd.to_datetime(df['Date'], format='%m/%d/%Y')
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    atomic_write_parquet(df, parquet_path)
+    return df
+
+
+# Date x Mode wide frame, rebuilt only when the CSV changes (mtime is part of the cache key)
+@st.cache_data
+def load_ridership_pivot(path=RIDERSHIP_PATH, mtime=None):
+    df = read_ridership(path)
+    pivot = df.pivot(index='Date', columns='Mode', values='Count').astype('float64')
+    pivot.columns = pivot.columns.astype(str)
+    return pivot.sort_index()
+
+
+# Trailing rolling mean of every column in one pass over the 2D array: window sums are differences
+# of cumulative sums, and a window with any missing day is NaN (like pandas min_periods=window)
+def rolling_mean(frame, window=7):
+    values = frame.to_numpy(dtype='float64')
+    missing = np.isnan(values)
+    sums = np.cumsum(np.where(missing, 0, values), axis=0)
+    counts = np.cumsum(missing, axis=0)
+    sums[window:] -= sums[:-window].copy()
+    counts[window:] -= counts[:-window].copy()
+    means = sums / window
+    means[counts > 0] = np.nan
+    means[:window - 1] = np.nan
+    return pd.DataFrame(means, index=frame.index, columns=frame.columns)
+
+
+@st.cache_data
+def load_rolling_pivot(path=RIDERSHIP_PATH, mtime=None, window=7, start=None):
+    return rolling_mean(load_ridership_pivot(path, mtime).loc[start:], window)
+
+
+# Seasonal counterfactual for every mode at once. The baseline window's daily pattern is rescaled
+# so its mean matches the anchor window (the days just before the policy), then laid over the
+# projection window day by day. Windows are (start, end) date strings; projection days past the
+# end of the baseline pattern are dropped. Returns (actual, counterfactual) date x mode frames.
+@st.cache_data
+def seasonal_counterfactual(path=RIDERSHIP_PATH, mtime=None, baseline=('2024-01-01', '2024-04-30'),
+                            anchor=('2024-12-24', '2024-12-31'), projection=('2025-01-01', '2025-04-30')):
+    pivot = load_ridership_pivot(path, mtime)
+    template = pivot.loc[baseline[0]:baseline[1]]
+    scale = pivot.loc[anchor[0]:anchor[1]].mean() / template.mean()
+
+    actual = pivot.loc[projection[0]:projection[1]]
+    offsets = actual.index - pd.Timestamp(projection[0])
+    rows = template.index.get_indexer(pd.Timestamp(baseline[0]) + offsets)
+    actual = actual[rows >= 0]
+    counterfactual = pd.DataFrame(template.to_numpy()[rows[rows >= 0]] * scale.to_numpy(),
+                                  index=actual.index, columns=pivot.columns)
+    return actual, counterfactual
+
+
+# Effect estimates with bootstrap confidence intervals, recomputed only when the CSV changes.
+# Dates are passed as strings and mode lists as tuples so they hash cheaply.
+@st.cache_data
+def load_its_estimates(path=RIDERSHIP_PATH, mtime=None, modes=('LIRR', 'MNR'), start='2024-01-01',
+                       intervention_date='2025-01-05'):
+    pivot = load_ridership_pivot(path, mtime)
+    return its_estimates(pivot.loc[start:, list(modes)], intervention_date)
+
+
+@st.cache_data
+def load_did_estimates(path=RIDERSHIP_PATH, mtime=None, treated=('LIRR', 'MNR'), controls=('SIR',),
+                       pre=('2024-01-01', '2024-04-30'), post=('2025-01-05', '2025-04-30'), log=False):
+    pivot = load_ridership_pivot(path, mtime)
+    return did_estimates(pivot, treated, controls, pre, post, log=log)
+
+
+# line colors per mode, shared by every chart on the page
+MODE_COLORS = {'LIRR': 'blue', 'MNR': 'green', 'SIR': 'purple', 'Subway': 'orange', 'Bus': 'teal',
+               'BT': 'brown', 'AAR': 'olive', 'CBD Entries': 'crimson', 'CRZ Entries': 'magenta'}
+
+
+# Chart rendering. Figures are built with the object-oriented matplotlib API instead of pyplot,
+# so concurrent sessions never share global figure state, and each chart is rendered to PNG
+# bytes once per distinct input (st.cache_data hashes the arguments).
+
+def _figure(**kwargs):
+    from matplotlib.figure import Figure
+
+    return Figure(**kwargs)
+
+
+def _png(fig):
+    buffer = io.BytesIO()
+    # same output settings st.pyplot uses
+    fig.savefig(buffer, format='png', dpi=200, bbox_inches='tight')
+    return buffer.getvalue()
+
+
+# 7-day averages per mode with the policy start and comparison windows marked
+@st.cache_data
+def render_its_chart(rolling_df, modes, colors, intervention_date, windows):
+    fig = _figure(figsize=(12, 4 * len(modes)))
+    axes = fig.subplots(len(modes), 1, sharex=True, squeeze=False)[:, 0]
+    for ax, mode, color in zip(axes, modes, colors):
+        ax.plot(rolling_df.index, rolling_df[mode], label=f'{mode} (7-day Avg)', color=color)
+        ax.axvline(intervention_date, color='red', linestyle='--', label='Policy Start')
+        for (start, end), (shade, alpha) in zip(windows, [('blue', 0.1), ('orange', 0.2)]):
+            ax.axvspan(start, end, color=shade, alpha=alpha)
+        ax.set_title(f'{mode} Ridership (7-day Avg) with Jan–Apr Highlights')
+        ax.legend()
+        ax.grid(True)
+    axes[-1].set_xlabel('Date')
+    fig.tight_layout()
+    return _png(fig)
+
+
+@st.cache_data
+def render_did_chart(avg_before, avg_after, modes, labels, title):
+    fig = _figure(figsize=(8, 6))
+    ax = fig.subplots()
+    x = np.arange(len(modes))
+    bar_width = 0.35
+    ax.bar(x - bar_width/2, avg_before[modes], bar_width, label=labels[0])
+    ax.bar(x + bar_width/2, avg_after[modes], bar_width, label=labels[1])
+    ax.set_xticks(x)
+    ax.set_xticklabels(modes)
+    ax.set_ylabel('Average Daily Riders (Jan–Apr)')
+    ax.set_title(title)
+    ax.legend()
+    ax.grid(axis='y', linestyle='--', alpha=0.6)
+    fig.tight_layout()
+    return _png(fig)
+
+
+# actual vs counterfactual ridership, one panel per mode
+@st.cache_data
+def render_counterfactual_chart(actual, counterfactual, modes, colors):
+    fig = _figure(figsize=(12, 4 * len(modes)))
+    axes = fig.subplots(len(modes), 1, sharex=True, squeeze=False)[:, 0]
+    for ax, mode, color in zip(axes, modes, colors):
+        ax.plot(actual.index, actual[mode], label=f'{mode} Actual', color=color)
+        ax.plot(counterfactual.index, counterfactual[mode], label='Seasonal Counterfactual',
+                linestyle='--', color='gray')
+        ax.set_title(f'{mode}: Actual vs Seasonal Counterfactual')
+        ax.legend()
+        ax.grid(True)
+    axes[-1].set_xlabel('Date')
+    fig.tight_layout()
+    return _png(fig)
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+# Disk-backed cache for SODA query results. Frames are stored as parquet next to a small
+# JSON sidecar holding the HTTP validators, so a restarted process (or another replica
+# pointed at the same directory) can serve them after a cheap revalidation request.
+
+BASE_DIR = Path(__file__).parent
+SODA_CACHE_DIR = Path(os.environ.get('CRZ_CACHE_DIR', BASE_DIR / 'data' / 'cache' / 'soda'))
+SODA_CACHE_MAX_BYTES = int(os.environ.get('CRZ_CACHE_MAX_BYTES', 512 * 1024 ** 2))
+
+
+def cache_key(url, params):
+    payload = json.dumps([url, sorted((str(k), str(v)) for k, v in params.items())])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# Shared by every on-disk store in the app. write(tmp_path) writes under a temp name that is then
+# renamed over path, so readers in other processes never see a partial file. The temp name starts
+# with '_', which parquet dataset reads skip.
+def atomic_write(path, write):
+    tmp_path = path.with_name(f'_{os.getpid()}_{path.name}')
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def atomic_write_parquet(frame, path):
+    atomic_write(path, lambda tmp_path: frame.to_parquet(tmp_path, index=False))
+
+
+# mtime of the newest parquet partition in a store directory, used as the store's data version
+# for caching; None when nothing has been written
+def store_version(store_dir):
+    partitions = list(Path(store_dir).glob('*.parquet'))
+    return max(path.stat().st_mtime for path in partitions) if partitions else None
+
+
+class FileCache:
+    # the sidecar's mtime doubles as the last-access time for LRU eviction
+    def __init__(self, directory=SODA_CACHE_DIR, max_bytes=SODA_CACHE_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _data_path(self, key):
+        return self.directory / f'{key}.parquet'
+
+    def _meta_path(self, key):
+        return self.directory / f'{key}.json'
+
+    def meta(self, key):
+        try:
+            return json.loads(self._meta_path(key).read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def get(self, key):
+        meta = self.meta(key)
+        if meta is None:
+            return None
+        try:
+            frame = pd.read_parquet(self._data_path(key))
+        except (FileNotFoundError, OSError):
+            return None
+        self.touch(key)
+        return frame, meta
+
+    def touch(self, key):
+        try:
+            os.utime(self._meta_path(key))
+        except FileNotFoundError:
+            pass
+
+    def put(self, key, frame, meta):
+        data_path = self._data_path(key)
+        atomic_write_parquet(frame, data_path)
+        meta = {**meta, 'size': data_path.stat().st_size, 'stored_at': time.time()}
+        atomic_write(self._meta_path(key), lambda path: path.write_text(json.dumps(meta)))
+        self.evict()
+
+    def delete(self, key):
+        self._data_path(key).unlink(missing_ok=True)
+        self._meta_path(key).unlink(missing_ok=True)
+
+    def _entries(self):
+        # (last_access, size, key) for every complete entry
+        entries = []
+        for meta_path in self.directory.glob('*.json'):
+            data_path = meta_path.with_suffix('.parquet')
+            try:
+                entries.append((meta_path.stat().st_mtime, data_path.stat().st_size, meta_path.stem))
+            except FileNotFoundError:
+                continue
+        return entries
+
+    def evict(self):
+        # drop least recently used entries until the cache fits in max_bytes
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            self.delete(key)
+            total -= size
+
+
+class SQLiteCache(FileCache):
+    # same file layout, with validators and access times indexed in SQLite so that
+    # eviction does not need to stat every file in a large shared directory
+    def __init__(self, directory=SODA_CACHE_DIR, max_bytes=SODA_CACHE_MAX_BYTES):
+        super().__init__(directory, max_bytes)
+        self.index_path = self.directory / 'index.sqlite'
+        with self._connect() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS entries (
+                                key TEXT PRIMARY KEY,
+                                meta TEXT NOT NULL,
+                                size INTEGER NOT NULL,
+                                accessed REAL NOT NULL)''')
+            conn.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+
+    # one transaction on a fresh connection, committed (or rolled back) and then closed;
+    # sqlite3's own context manager only ends the transaction and leaves the connection open
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.index_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def meta(self, key):
+        with self._connect() as conn:
+            row = conn.execute('SELECT meta FROM entries WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def touch(self, key):
+        with self._connect() as conn:
+            conn.execute('UPDATE entries SET accessed = ? WHERE key = ?', (time.time(), key))
+
+    def put(self, key, frame, meta):
+        data_path = self._data_path(key)
+        atomic_write_parquet(frame, data_path)
+        size = data_path.stat().st_size
+        meta = {**meta, 'size': size, 'stored_at': time.time()}
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)',
+                         (key, json.dumps(meta), size, time.time()))
+        self.evict()
+
+    def delete(self, key):
+        self._data_path(key).unlink(missing_ok=True)
+        with self._connect() as conn:
+            conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+
+    def _entries(self):
+        with self._connect() as conn:
+            return conn.execute('SELECT accessed, size, key FROM entries').fetchall()
+
+
+CACHE_BACKENDS = {'file': FileCache, 'sqlite': SQLiteCache}
+
+
+def open_cache(backend=None, directory=SODA_CACHE_DIR, max_bytes=SODA_CACHE_MAX_BYTES):
+    backend = backend or os.environ.get('CRZ_CACHE_BACKEND', 'file')
+    return CACHE_BACKENDS[backend](directory, max_bytes)
@@ -1,40 +1,333 @@
+import builtins
+import importlib
+import io
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import types
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+import numpy as np
 import pandas as pd
 import streamlit as st
-import altair as alt
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from periods import MONTH_NAMES, MonthlySeries
+from soda_cache import cache_key, open_cache
+
+# set CRZ_PROFILE_IMPORTS=1 to show per-module import times in each page's sidebar
+PROFILE_IMPORTS = os.environ.get('CRZ_PROFILE_IMPORTS') == '1'
+
+# import timings for the script run on the current thread (one thread per session run)
+_import_profile = threading.local()
+
+def _record_import(name, seconds):
+    if PROFILE_IMPORTS:
+        if not hasattr(_import_profile, 'records'):
+            _import_profile.records = []
+        _import_profile.records.append((name, seconds))
+
+# Module placeholder that performs the real import on first attribute access,
+# so heavy libraries load only when the chart that needs them renders
+class LazyModule(types.ModuleType):
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__['_module'] = None
+        self.__dict__['_lock'] = threading.Lock()
+
+    def _load(self):
+        with self.__dict__['_lock']:
+            if self.__dict__['_module'] is None:
+                start = time.perf_counter()
+                self.__dict__['_module'] = importlib.import_module(self.__name__)
+                _record_import(self.__name__, time.perf_counter() - start)
+        return self.__dict__['_module']
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+def lazy_import(name):
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
+
+# In profile mode, time every first-time top-level import made after this module loads
+# (nested imports are included in their parent's time)
+if PROFILE_IMPORTS:
+    _original_import = builtins.__import__
+
+    def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules or getattr(_import_profile, 'active', False):
+            return _original_import(name, globals, locals, fromlist, level)
+        _import_profile.active = True
+        start = time.perf_counter()
+        try:
+            return _original_import(name, globals, locals, fromlist, level)
+        finally:
+            _import_profile.active = False
+            _record_import(name, time.perf_counter() - start)
+
+    builtins.__import__ = _timed_import
+
+# Sidebar report of the imports made during this page run; call at the end of a page
+def show_import_profile():
+    if not PROFILE_IMPORTS:
+        return
+    records = getattr(_import_profile, 'records', [])
+    _import_profile.records = []
+    with st.sidebar.expander('Import profile', expanded=True):
+        if not records:
+            st.caption('No new imports in this run.')
+            return
+        profile = (pd.DataFrame(records, columns=['Module', 'Seconds'])
+                   .sort_values('Seconds', ascending=False)
+                   .reset_index(drop=True))
+        st.dataframe(profile)
+        st.caption(f"Total: {profile['Seconds'].sum():.3f}s")
+
+alt = lazy_import('altair')
+pa = lazy_import('pyarrow')
+pa_csv = lazy_import('pyarrow.csv')
+
+# rows per SODA request and number of requests in flight at once
+SODA_PAGE_SIZE = 50000
+SODA_MAX_WORKERS = 4
+
+# Pooled session that retries throttled (429) and transient server errors with exponential backoff
+def soda_session(max_workers=SODA_MAX_WORKERS):
+    retry = Retry(total=5, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                  allowed_methods=['GET'])
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=max_workers, pool_maxsize=max_workers)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+# Row-count request for a query. Passing the validators of a cached result makes it a
+# conditional request, answered with 304 Not Modified when the dataset has not changed.
+def soda_count_request(session, BASE_URL, params, etag=None, last_modified=None):
+    count_params = {'$select': 'count(*) AS n'}
+    if '$where' in params:
+        count_params['$where'] = params['$where']
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    return session.get(BASE_URL, params=count_params, headers=headers, timeout=60)
+
+# SODA column types -> pyarrow type aliases for typed CSV parsing. Anything else (text, point,
+# location, url, ...) is read as a string, so values like ZIP codes keep their leading zeros.
+SODA_ARROW_TYPES = {
+    'floating_timestamp': 'timestamp[ms]',
+    'calendar_date': 'timestamp[ms]',
+    'number': 'float64',
+    'double': 'float64',
+    'money': 'float64',
+    'percent': 'float64',
+    'checkbox': 'bool',
+}
+
+# same resource as CSV: /resource/<id>.json -> /resource/<id>.csv
+def soda_csv_url(BASE_URL):
+    return BASE_URL[:-len('.json')] + '.csv' if BASE_URL.endswith('.json') else BASE_URL + '.csv'
+
+# Column -> pyarrow type alias for a response, from the field and type headers SODA sends with
+# every query result. A declared schema ({column: alias}) overrides the dataset's own types.
+def soda_column_types(headers, schema='auto'):
+    types = {}
+    if 'X-SODA2-Fields' in headers and 'X-SODA2-Types' in headers:
+        fields = json.loads(headers['X-SODA2-Fields'])
+        soda_types = json.loads(headers['X-SODA2-Types'])
+        types = {field: SODA_ARROW_TYPES.get(soda_type, 'string') for field, soda_type in zip(fields, soda_types)}
+    if isinstance(schema, dict):
+        types.update(schema)
+    return types
 
-# Fetch data from NYC Open Data API
+# Parse a SODA CSV response straight into typed, nullable columns (empty fields become NaN/NaT/None).
+# A page whose values do not fit a declared type is re-read as strings and coerced, so a stray
+# value becomes a missing one instead of failing the whole load.
+def read_soda_csv(content, column_types):
+    def read(types):
+        arrow_types = {column: pa.type_for_alias(alias) for column, alias in types.items()}
+        convert = pa_csv.ConvertOptions(column_types=arrow_types, strings_can_be_null=True)
+        return pa_csv.read_csv(io.BytesIO(content), convert_options=convert).to_pandas()
+
+    try:
+        return read(column_types)
+    except pa.ArrowInvalid:
+        df = read({column: 'string' for column in column_types})
+        for column, alias in column_types.items():
+            if column not in df.columns:
+                continue
+            if alias.startswith('timestamp'):
+                df[column] = pd.to_datetime(df[column], errors='coerce')
+            elif alias != 'string':
+                df[column] = pd.to_numeric(df[column], errors='coerce')
+        return df
+
+# Page through a SODA dataset with $offset, fetching up to max_workers pages ahead concurrently.
+# Rows are ordered by :id (as a tie-breaker after any requested $order), so pages never overlap
+# or skip rows, and paging stops at the first short page rather than at a row count taken up
+# front, so rows added while paging are not cut off.
+# A '$limit' in params caps the total number of rows rather than the page size.
+# With a schema ('auto' or a {column: pyarrow type alias} dict) pages are requested as CSV and
+# parsed into typed columns; without one they are JSON and every column is a string.
+def iter_soda_pages(BASE_URL, params, page_size=SODA_PAGE_SIZE, max_workers=SODA_MAX_WORKERS, session=None,
+                    schema=None):
+    params = dict(params)
+    limit = params.pop('$limit', None)
+    limit = None if limit is None else int(limit)
+    params.pop('$offset', None)
+    order = params.get('$order')
+    params['$order'] = order if order and ':id' in order else f'{order}, :id' if order else ':id'
+
+    session = session or soda_session(max_workers)
+    page_url = BASE_URL if schema is None else soda_csv_url(BASE_URL)
+    offsets = iter(range(0, limit, page_size)) if limit is not None else itertools.count(0, page_size)
+
+    def page_rows(offset):
+        return page_size if limit is None else min(page_size, limit - offset)
+
+    def fetch_page(offset):
+        page_params = {**params, '$limit': page_rows(offset), '$offset': offset}
+        response = session.get(page_url, params=page_params, timeout=120)
+        response.raise_for_status()
+        if schema is None:
+            return pd.DataFrame(response.json())
+        return read_soda_csv(response.content, soda_column_types(response.headers, schema))
+
+    # at most max_workers pages are in flight and they are yielded in order,
+    # so only a bounded number of decoded pages is held at any time
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = deque((offset, pool.submit(fetch_page, offset))
+                        for offset in itertools.islice(offsets, max_workers))
+        while pending:
+            offset, future = pending.popleft()
+            page = future.result()
+            if len(page):
+                yield page
+            if len(page) < page_rows(offset):
+                # past the end of the data: pages requested ahead of this one are empty
+                for _, ahead in pending:
+                    ahead.cancel()
+                return
+            next_offset = next(offsets, None)
+            if next_offset is not None:
+                pending.append((next_offset, pool.submit(fetch_page, next_offset)))
+
+# SoQL within_box() takes the north-west corner followed by the south-east corner.
+# boxes are (lat_min, lat_max, lon_min, lon_max) tuples throughout the app
+def within_box(box, geo_column='location'):
+    lat_min, lat_max, lon_min, lon_max = box
+    return f"within_box({geo_column}, {lat_max}, {lon_min}, {lat_min}, {lon_max})"
+
+# Build SODA query params so filtering and column selection happen server-side.
+# where may be a single clause or a list of clauses that are AND-ed together,
+# rows inside any of the boxes are kept.
+def soda_params(select=None, where=None, boxes=None, geo_column='location', order=None, limit=None):
+    params = {}
+    if select:
+        params['$select'] = ', '.join(select)
+
+    clauses = [where] if isinstance(where, str) else list(where or [])
+    if boxes:
+        clauses.append(' OR '.join(within_box(box, geo_column) for box in boxes))
+    if clauses:
+        params['$where'] = ' AND '.join(f'({clause})' for clause in clauses)
+
+    if order:
+        params['$order'] = order
+    if limit is not None:
+        params['$limit'] = limit
+    return params
+
+# Shared by every session in the process; results persist on disk across restarts
+@st.cache_resource
+def soda_cache():
+    return open_cache()
+
+# Fetch data from NYC Open Data API.
+# The in-memory cache expiring only costs a conditional request: the on-disk copy is
+# served again unless the dataset has changed since it was stored.
+# schema='auto' types columns from the dataset's metadata; a {column: pyarrow type alias} dict
+# (e.g. {'crash_date': 'timestamp[ms]', 'latitude': 'float64'}) declares them; None keeps strings.
 @st.cache_data(ttl=3600) # Cache data for 1 hour
-def load_data(BASE_URL, params):
+def load_data(BASE_URL, params, schema=None):
+    cache = soda_cache()
+    key = cache_key(BASE_URL, params if schema is None else {**params, 'schema': json.dumps(schema, sort_keys=True)})
+    cached = cache.get(key)
+    meta = cached[1] if cached else {}
     try:
-        response = requests.get(BASE_URL, params=params)
-        response.raise_for_status() # Raise an exception for bad status codes
-        data = response.json()
-        if not data:
+        session = soda_session()
+        probe = soda_count_request(session, BASE_URL, params,
+                                   etag=meta.get('etag'), last_modified=meta.get('last_modified'))
+        if probe.status_code == 304 and cached:
+            return cached[0]
+        probe.raise_for_status()
+
+        # the count probe only checks for changes; paging runs until the data ends
+        chunks = list(iter_soda_pages(BASE_URL, params, session=session, schema=schema))
+        if not chunks:
             st.error("No data received from the API.")
             return pd.DataFrame()
-        crash_df = pd.DataFrame(data)
-        return crash_df
+        df = pd.concat(chunks, ignore_index=True)
+
+        try:
+            cache.put(key, df, {'url': BASE_URL, 'etag': probe.headers.get('ETag'),
+                                'last_modified': probe.headers.get('Last-Modified')})
+        except (OSError, ValueError, TypeError) as e:
+            # e.g. nested JSON columns parquet cannot store; the result is still usable
+            st.warning(f"Could not cache API response: {e}")
+        return df
     except requests.exceptions.RequestException as e:
+        if cached:
+            # serve the last good copy when the API is unreachable
+            st.warning(f"Error fetching data from API, showing cached data: {e}")
+            return cached[0]
         st.error(f"Error fetching data from API: {e}")
         return pd.DataFrame()
     except Exception as e:
         st.error(f"An error occurred: {e}")
         return pd.DataFrame()
 
-def plot_tlc_metric(df, value_col, title, ylabel):
-    month_order = ['January', 'February', 'March']
+# rows above which plot_tlc_metric pre-aggregates to one point per (Year, Month)
+CHART_MAX_ROWS = 5000
+
+def plot_tlc_metric(df, value_col, title, ylabel, aggregate='mean', max_rows=CHART_MAX_ROWS):
+    # only the encoded columns go into the chart; integer columns are downcast to the smallest type
+    # that holds them, floats stay float64 so the plotted values are exactly the input values
+    values = df[value_col]
+    data = pd.DataFrame({'Month': df['Month'].astype('category'),
+                         'Year': pd.to_numeric(df['Year'], downcast='integer'),
+                         value_col: pd.to_numeric(values, downcast='integer')
+                         if pd.api.types.is_integer_dtype(values) else values.astype('float64')})
+    # large inputs are reduced server-side to the points the line chart draws, so the payload is
+    # bounded by the number of (Year, Month) pairs however much history is passed in
+    if len(data) > max_rows:
+        data = data.groupby(['Year', 'Month'], observed=True, as_index=False)[value_col].agg(aggregate)
 
-    # get min & max values for y-scale
-    min_val = df[value_col].min()
-    max_val = df[value_col].max()
+    # calendar order of whichever months are being compared
+    month_order = [month for month in MONTH_NAMES if month in set(data['Month'])]
+
+    # get min & max values for y-scale from the (small) projected column
+    values = data[value_col].to_numpy()
+    min_val, max_val = (float(np.nanmin(values)), float(np.nanmax(values))) if len(values) else (0, 0)
 
     # Altair line chart
-    chart = alt.Chart(df).mark_line(point=True).encode(
+    chart = alt.Chart(data).mark_line(point=True).encode(
         x=alt.X('Month:N', sort=month_order, title='Month'),
         y=alt.Y(f'{value_col}:Q', title=ylabel, scale=alt.Scale(domain=[min_val - 0.1 * min_val, max_val + 0.1 * max_val])),
         color=alt.Color('Year:N', scale=alt.Scale(scheme='tableau10'), title='Year'),
-        tooltip=['Month', 'Year', alt.Tooltip(value_col, title=ylabel)]
+        tooltip=['Month', 'Year', alt.Tooltip(value_col, title=ylabel, format=',.2~f')]
     ).properties(
         #title=title,
         width=600,
@@ -43,18 +336,67 @@ def plot_tlc_metric(df, value_col, title, ylabel):
 
     return chart
 
-def preprocess_tlc_data(df, metrics, license_types):
-    # specifiy data types 
-    df['month_year'] = pd.to_datetime(df['month_year'])
-    for col in metrics:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-            
-    # filter data to Jan/Feb/March 2024 & 2025
-    df_filtered = df[df['month_year'].dt.month.isin([1, 2, 3]) & df['month_year'].dt.year.isin([2024, 2025])].copy()
-    df_filtered['Month'] = df_filtered['month_year'].dt.strftime('%B')
-    df_filtered['Year'] = df_filtered['month_year'].dt.year
+# TLC monthly industry indicators: one row per license class and month
+TLC_INDICATORS_URL = "https://data.cityofnewyork.us/resource/v6kb-cqej.json"
+TLC_METRICS = [
+    'trips_per_day',
+    'farebox_per_day',
+    'unique_drivers',
+    'unique_vehicles',
+    'vehicles_per_day',
+    'avg_days_vehicles_on_road',
+    'avg_hours_per_day_per_vehicle',
+    'avg_days_drivers_on_road',
+    'avg_hours_per_day_per_driver',
+    'avg_minutes_per_trip',
+    'percent_of_trips_paid_with_credit_card',
+    'trips_per_day_shared',
+]
+
+# Indicators indexed by (license_class, month_year), sorted so each license class is one
+# contiguous block of rows. Metrics are float64 columns of a single block, so a license class
+# (indicators.loc['Yellow']) or one of its metrics (indicators.loc['Yellow', metric]) is a slice
+# of that block, not a filtered copy.
+def preprocess_tlc_data(df, metrics=TLC_METRICS):
+    if df.empty:
+        index = pd.MultiIndex.from_arrays([[], pd.DatetimeIndex([])], names=['license_class', 'month_year'])
+        return pd.DataFrame(columns=list(metrics), index=index, dtype='float64')
+
+    metrics = [col for col in metrics if col in df.columns]
+    df = df.dropna(subset=['license_class', 'month_year'])
+    return (df.astype({'license_class': 'category'})
+            .set_index(['license_class', 'month_year'])[metrics]
+            .astype('float64')
+            .sort_index())
 
+# All metrics are fetched in one request and processed once, whichever of them a page shows
+@st.cache_data(ttl=3600) # Cache data for 1 hour, like load_data
+def load_tlc_indicators(metrics=tuple(TLC_METRICS)):
+    params = soda_params(select=['month_year', 'license_class'] + list(metrics))
+    schema = {'month_year': 'timestamp[ms]', 'license_class': 'string', **{metric: 'float64' for metric in metrics}}
+    return preprocess_tlc_data(load_data(TLC_INDICATORS_URL, params, schema=schema), metrics)
+
+# One license class's rows indexed by month_year: a slice of the shared frame (empty if the
+# class has no rows)
+def tlc_license_frame(indicators, license_class):
+    try:
+        return indicators.loc[license_class]
+    except KeyError:
+        return indicators.iloc[:0].droplevel('license_class')
 
+# Per license class monthly series for year-over-year comparisons, built once from the indicators
+@st.cache_data(ttl=3600)
+def load_tlc_series(metrics=tuple(TLC_METRICS)):
+    indicators = load_tlc_indicators(metrics)
+    license_classes = indicators.index.remove_unused_levels().levels[0]
+    return {license_class: MonthlySeries.from_frame(tlc_license_frame(indicators, license_class)[list(metrics)])
+            for license_class in license_classes}
 
-            
\ No newline at end of file
+# Year and month pickers shared by the comparison pages; returns (years, months) with months as 1-12
+def period_controls(years, months, default_years=(2024, 2025), default_months=(1, 2, 3)):
+    chosen_years = st.sidebar.multiselect('Compare years', years,
+                                          default=[year for year in default_years if year in years])
+    chosen_months = st.sidebar.multiselect('Months', [MONTH_NAMES[month - 1] for month in months],
+                                           default=[MONTH_NAMES[month - 1] for month in default_months
+                                                    if month in months])
+    return sorted(chosen_years), sorted(MONTH_NAMES.index(month) + 1 for month in chosen_months)